@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import spacy
+from spacy.tokens import Doc
+
+from buildnetwork import build_network
+from find_SVOs import findSVOs
+from lexicon import LexiconMatcher
+from main import extended_SVOs
+from utils import get_inoutinstances, boolregex, get_inout_grp, mergesubtokens, passive_phrases, set_passive_spans
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preprocessing'))
+from prepration import preprocess
+
+
+# the synthetic sentences are built from templates which carry their own dependency parse, so the benchmarks need
+# neither a trained pipeline nor the network, and give the same docs whatever the spaCy version.
+# a template token is (text, pos, tag, dep, head), head being the index of its head in the template; GROUP is a
+# plural group of the lexicon, VERB a verb (as the tag says), NOUN a noun which is not a group
+GROUP = '<group>'
+VERB = '<verb>'
+NOUN = '<noun>'
+
+TEMPLATES = [
+    # the muslims attacked the jews .
+    [('the', 'DET', 'DT', 'det', 1), (GROUP, 'NOUN', 'NNS', 'nsubj', 2), (VERB, 'VERB', 'VBD', 'ROOT', 2),
+     ('the', 'DET', 'DT', 'det', 4), (GROUP, 'NOUN', 'NNS', 'dobj', 2), ('.', 'PUNCT', '.', 'punct', 2)],
+    # the jews were attacked by the muslims .
+    [('the', 'DET', 'DT', 'det', 1), (GROUP, 'NOUN', 'NNS', 'nsubjpass', 3), ('were', 'AUX', 'VBD', 'auxpass', 3),
+     (VERB, 'VERB', 'VBN', 'ROOT', 3), ('by', 'ADP', 'IN', 'agent', 3), ('the', 'DET', 'DT', 'det', 6),
+     (GROUP, 'NOUN', 'NNS', 'pobj', 4), ('.', 'PUNCT', '.', 'punct', 3)],
+    # muslims did not attack the jews .
+    [(GROUP, 'NOUN', 'NNS', 'nsubj', 3), ('did', 'AUX', 'VBD', 'aux', 3), ('not', 'PART', 'RB', 'neg', 3),
+     (VERB, 'VERB', 'VB', 'ROOT', 3), ('the', 'DET', 'DT', 'det', 5), (GROUP, 'NOUN', 'NNS', 'dobj', 3),
+     ('.', 'PUNCT', '.', 'punct', 3)],
+    # the muslims and the christians attacked the jews and the infidels .
+    [('the', 'DET', 'DT', 'det', 1), (GROUP, 'NOUN', 'NNS', 'nsubj', 5), ('and', 'CCONJ', 'CC', 'cc', 1),
+     ('the', 'DET', 'DT', 'det', 4), (GROUP, 'NOUN', 'NNS', 'conj', 1), (VERB, 'VERB', 'VBD', 'ROOT', 5),
+     ('the', 'DET', 'DT', 'det', 7), (GROUP, 'NOUN', 'NNS', 'dobj', 5), ('and', 'CCONJ', 'CC', 'cc', 7),
+     ('the', 'DET', 'DT', 'det', 10), (GROUP, 'NOUN', 'NNS', 'conj', 7), ('.', 'PUNCT', '.', 'punct', 5)],
+    # the leader of the muslims attacked the jews .
+    [('the', 'DET', 'DT', 'det', 1), ('leader', 'NOUN', 'NN', 'nsubj', 5), ('of', 'ADP', 'IN', 'prep', 1),
+     ('the', 'DET', 'DT', 'det', 4), (GROUP, 'NOUN', 'NNS', 'pobj', 2), (VERB, 'VERB', 'VBD', 'ROOT', 5),
+     ('the', 'DET', 'DT', 'det', 7), (GROUP, 'NOUN', 'NNS', 'dobj', 5), ('.', 'PUNCT', '.', 'punct', 5)],
+    # the non-muslims attacked the jews .
+    [('the', 'DET', 'DT', 'det', 3), ('non', 'ADJ', 'JJ', 'amod', 3), ('-', 'PUNCT', 'HYPH', 'punct', 3),
+     (GROUP, 'NOUN', 'NNS', 'nsubj', 4), (VERB, 'VERB', 'VBD', 'ROOT', 4), ('the', 'DET', 'DT', 'det', 6),
+     (GROUP, 'NOUN', 'NNS', 'dobj', 4), ('.', 'PUNCT', '.', 'punct', 4)],
+    # the police arrested the jews .
+    [('the', 'DET', 'DT', 'det', 1), (NOUN, 'NOUN', 'NNS', 'nsubj', 2), (VERB, 'VERB', 'VBD', 'ROOT', 2),
+     ('the', 'DET', 'DT', 'det', 4), (GROUP, 'NOUN', 'NNS', 'dobj', 2), ('.', 'PUNCT', '.', 'punct', 2)],
+]
+
+# (past tense, base form, past participle, lemma)
+VERBS = [('attacked', 'attack', 'attacked', 'attack'), ('killed', 'kill', 'killed', 'kill'),
+         ('helped', 'help', 'helped', 'help'), ('hated', 'hate', 'hated', 'hate'),
+         ('fought', 'fight', 'fought', 'fight'), ('supported', 'support', 'supported', 'support'),
+         ('betrayed', 'betray', 'betrayed', 'betray'), ('praised', 'praise', 'praised', 'praise')]
+NOUNS = ['police', 'soldiers', 'people', 'leaders', 'villagers', 'journalists']
+ADJECTIVES = ['brave', 'evil', 'many', 'young', 'foreign', 'local', 'poor', 'armed', 'other', 'true']
+
+
+def make_lexicon(size, rng):
+    # made up group names, a few of them with a multi-word 'leader of the ...' label as well
+    syllables = [c + v for c in 'bdfgklmnprstvz' for v in 'aeiou']
+    names = set()
+    while len(names) < size:
+        names.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    rows = [(name, rng.choice(['ingroup', 'outgroup'])) for name in sorted(names)]
+    rows += [('leader of the %s' % name, grouptype) for name, grouptype in rows[:max(1, size // 20)]]
+    return pd.DataFrame(rows, columns=['group_name', 'group_type'])
+
+
+def make_doc(vocab, rng, groups, length):
+    template = rng.choice(TEMPLATES)
+    verb = rng.choice(VERBS)
+
+    # adjectives in front of the groups, until the sentence has the wanted length; not inside 'non-...'
+    paddable = [i for i, tok in enumerate(template) if tok[0] in (GROUP, NOUN) and template[i - 1][0] != '-']
+    extra = {i: 0 for i in paddable}
+    for _ in range(max(0, length - len(template))):
+        extra[rng.choice(paddable)] += 1
+
+    tokens = []
+    position = {}
+    for i, (text, pos, tag, dep, head) in enumerate(template):
+        for _ in range(extra.get(i, 0)):
+            word = rng.choice(ADJECTIVES)
+            tokens.append((word, 'ADJ', 'JJ', 'amod', i, word))
+        if text == GROUP:
+            text = rng.choice(groups) + 's'
+            lemma = text[:-1]
+        elif text == NOUN:
+            text = rng.choice(NOUNS)
+            lemma = text
+        elif text == VERB:
+            text = verb[0] if tag == 'VBD' else verb[1] if tag == 'VB' else verb[2]
+            lemma = verb[3]
+        else:
+            lemma = text
+        position[i] = len(tokens)
+        tokens.append((text, pos, tag, dep, head, lemma))
+
+    words = [tok[0] for tok in tokens]
+    spaces = [not (word in ('non', '-') or (i + 1 < len(words) and words[i + 1] == '.'))
+              for i, word in enumerate(words)]
+    spaces[-1] = False
+    return Doc(vocab, words=words, spaces=spaces, pos=[tok[1] for tok in tokens], tags=[tok[2] for tok in tokens],
+               deps=[tok[3] for tok in tokens], heads=[position[tok[4]] for tok in tokens],
+               lemmas=[tok[5] for tok in tokens])
+
+
+# synthetic corpus and lexicon; the docs are built again from the same seed for the benchmarks changing them
+class Corpus:
+    def __init__(self, sentences, length_mean, length_sd, lexicon_size, seed, workdir):
+        self.sentences = sentences
+        self.length_mean = length_mean
+        self.length_sd = length_sd
+        self.seed = seed
+        self.workdir = workdir
+        self.vocab = spacy.blank('en').vocab
+
+        rng = random.Random(seed)
+        self.inoutpath = '%s/lexicon.csv' % workdir
+        make_lexicon(lexicon_size, rng).to_csv(self.inoutpath, index=False)
+        self.inoutlabels = get_inoutinstances(self.inoutpath).group_name.tolist()
+        self.lexicon = LexiconMatcher(self.inoutlabels)
+        self.groups = [label for label in self.inoutlabels if ' ' not in label]
+
+    def docs(self):
+        rng = random.Random(self.seed)
+        docs = []
+        for _ in range(self.sentences):
+            length = max(1, int(round(rng.gauss(self.length_mean, self.length_sd))))
+            docs.append(make_doc(self.vocab, rng, self.groups, length))
+        return docs
+
+    def parsed_docs(self):
+        # as they come out of the pipeline: sub-tokens merged and passive spans set
+        docs = self.docs()
+        for doc in docs:
+            mergesubtokens(doc)
+            set_passive_spans(doc)
+        return docs
+
+
+def bench_findSVOs(corpus):
+    def run(docs):
+        for doc in docs:
+            findSVOs(doc)
+        return len(docs)
+    docs = corpus.parsed_docs()
+    return lambda: (docs,), run
+
+
+def bench_lexicon(corpus):
+    # the subject and object phrases of the triples, and the groups which don't match any of them
+    phrases = []
+    for doc in corpus.parsed_docs():
+        for sub, _, obj in findSVOs(doc):
+            phrases.extend([sub, obj])
+
+    def run(phrases):
+        for phrase in phrases:
+            if boolregex(phrase, corpus.lexicon):
+                get_inout_grp(phrase, corpus.lexicon)
+        return len(phrases)
+    return lambda: (phrases,), run
+
+
+def bench_mergesubtokens(corpus):
+    def run(docs):
+        for doc in docs:
+            mergesubtokens(doc)
+        return len(docs)
+    # merging changes the docs, every run gets new ones
+    return lambda: (corpus.docs(),), run
+
+
+def bench_passive_phrases(corpus):
+    def run(docs):
+        for doc in docs:
+            passive_phrases(doc)
+        return len(docs)
+    docs = corpus.docs()
+    return lambda: (docs,), run
+
+
+def bench_preprocess(corpus):
+    # paragraphs of one to five sentences
+    rng = random.Random(corpus.seed)
+    texts = [doc.text for doc in corpus.docs()]
+    paragraphs = []
+    while texts:
+        n = rng.randint(1, 5)
+        paragraphs.append(' '.join(texts[:n]))
+        texts = texts[n:]
+    df = pd.DataFrame({'name_id': range(len(paragraphs)), 'sentence': paragraphs})
+    runs = iter(range(sys.maxsize))
+
+    def run(df, filename):
+        preprocess(df, corpus.workdir + '/', filename, verbose=False)
+        return len(df)
+    # preprocess returns early when its output exists, every run writes a new file
+    return lambda: (df, 'corpus%d' % next(runs)), run
+
+
+def bench_buildnetwork(corpus):
+    # the structured output of the extraction, so building the network doesn't need a pipeline for the verb lemmas
+    pathtojson = '%s/SVOs.json' % corpus.workdir
+    triples = 0
+    with open(pathtojson, 'w') as out_file:
+        for rid, doc in enumerate(corpus.parsed_docs(), 1):
+            extended, info = extended_SVOs(findSVOs(doc, structured=True), corpus.lexicon, structured=True)
+            if extended:
+                out_file.write(json.dumps({'id': rid, 'sentence': doc.text, 'extended_SVO': extended,
+                                           'SVO_info': info}) + '\n')
+                triples += len(extended)
+
+    def run():
+        build_network(pathtojson, corpus.inoutpath)
+        return triples
+    return lambda: (), run
+
+
+BENCHMARKS = {'findSVOs': bench_findSVOs,
+              'lexicon': bench_lexicon,
+              'mergesubtokens': bench_mergesubtokens,
+              'passive_phrases': bench_passive_phrases,
+              'preprocess': bench_preprocess,
+              'buildnetwork': bench_buildnetwork}
+
+
+def run_benchmark(setup, func, repeat):
+    # the best time over the repeats, and the peak of the python allocations during one more (slower) traced run
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        ops = func(*args)
+        times.append(time.perf_counter() - start)
+
+    args = setup()
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {'ops': ops,
+            'best_sec': best,
+            'ops_per_sec': ops / best if best > 0 else float('inf'),
+            'peak_memory_mb': peak / 1024 ** 2}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args):
+    names = args.benchmarks.split(',')
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError('unknown benchmark %s, expected one of %s' % (name, ', '.join(BENCHMARKS)))
+
+    report = {'commit': git_commit(),
+              'python': platform.python_version(),
+              'spacy': spacy.__version__,
+              'pandas': pd.__version__,
+              'config': {'sentences': args.sentences, 'length_mean': args.length_mean, 'length_sd': args.length_sd,
+                         'lexicon_size': args.lexicon_size, 'seed': args.seed, 'repeat': args.repeat},
+              'results': {}}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = Corpus(args.sentences, args.length_mean, args.length_sd, args.lexicon_size, args.seed, workdir)
+        for name in names:
+            setup, func = BENCHMARKS[name](corpus)
+            report['results'][name] = run_benchmark(setup, func, args.repeat)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r') as in_file:
+            baseline = json.load(in_file)['results']
+
+    print('%-16s %10s %14s %14s %12s' % ('benchmark', 'ops', 'ops/sec', 'peak mem (MB)', 'vs compare'))
+    for name, result in report['results'].items():
+        ratio = ''
+        if name in baseline:
+            ratio = '%.2fx' % (result['ops_per_sec'] / baseline[name]['ops_per_sec'])
+        print('%-16s %10d %14.1f %14.1f %12s' % (name, result['ops'], result['ops_per_sec'],
+                                                 result['peak_memory_mb'], ratio))
+
+    os.makedirs(args.save_dir, exist_ok=True)
+    outpath = '%s/benchmark_%s.json' % (args.save_dir, report['commit'] or 'local')
+    with open(outpath, 'w') as out_file:
+        json.dump(report, out_file, indent=2)
+    print('saved to %s' % outpath)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--benchmarks",
+                        default=','.join(BENCHMARKS),
+                        type=str,
+                        help="comma separated benchmarks to run, among %s." % ', '.join(BENCHMARKS))
+
+    parser.add_argument("--sentences",
+                        default=2000,
+                        type=int,
+                        help="number of sentences of the synthetic corpus.")
+
+    parser.add_argument("--length_mean",
+                        default=12,
+                        type=float,
+                        help="mean number of tokens of a sentence (normally distributed, at least the length of its "
+                             "template).")
+
+    parser.add_argument("--length_sd",
+                        default=6,
+                        type=float,
+                        help="standard deviation of the number of tokens of a sentence.")
+
+    parser.add_argument("--lexicon_size",
+                        default=200,
+                        type=int,
+                        help="number of groups of the synthetic lexicon.")
+
+    parser.add_argument("--seed",
+                        default=13,
+                        type=int,
+                        help="seed of the corpus and lexicon generator.")
+
+    parser.add_argument("--repeat",
+                        default=3,
+                        type=int,
+                        help="number of timed runs of every benchmark, the best one is reported.")
+
+    parser.add_argument("--save_dir",
+                        default='./save/',
+                        type=str,
+                        help="path to saving directory, the results are written to benchmark_<commit>.json.")
+
+    parser.add_argument("--compare",
+                        default=None,
+                        type=str,
+                        help="results of a previous run (benchmark_<commit>.json) to compare the ops/sec with.")
+
+    args = parser.parse_args()
+    main(args)
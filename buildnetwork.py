@@ -1,23 +1,25 @@
 import pandas as pd
+import numpy as np
 import json
+import os
 import argparse
-import spacy
 import nltk
 from nltk.stem.porter import PorterStemmer
 from nltk.stem import WordNetLemmatizer
+import columnar
+from fileio import COMPRESSIONS, compression_of, loads, open_file, read_lines, resolve, set_json_codec
+from models import PROFILES, DEFAULT_PROFILE, get_nlp, set_profile
+import profiler
 from utils import get_inoutinstances
 
-nltk.download('wordnet')
-
 lemmatizer = WordNetLemmatizer()
 porter_stemmer = PorterStemmer()
 
-nlp = spacy.load('en_core_web_lg', disable=['parser', 'ner'])
-
 
 def read_SVOs(pathtojason):
-    for line in open(pathtojason, 'r'):
-        yield json.loads(line)
+    with open_file(pathtojason, 'rb') as in_file:
+        for line in in_file:
+            yield loads(line)
 
 
 def getverbroot(verb):
@@ -25,133 +27,260 @@ def getverbroot(verb):
     if '!' in verb:
         prefix = '!'
         verb = verb.replace('!', '')
-    lemma = [token.lemma_ for token in nlp(verb)][0]
+    lemma = [token.lemma_ for token in get_nlp('lemma')(verb)][0]
     return prefix + lemma
 
 
-def getnodes(pathtojason, pathtoinoutfile, savedir):
-    inout_file = get_inoutinstances(pathtoinoutfile)
+def svo_verbroots(row):
+    # the verb roots of the triples of a record, taken from the structured details when the extraction kept them
+    if 'SVO_info' in row:
+        return [('!' if info['negated'] else '') + info['lemma'] for info in row['SVO_info']]
+    return [getverbroot(sv[1]) for sv in row['extended_SVO']]
+
+
+def read_triples(pathtojason, position=None):
+    # yields the (subject group, verb root, object group) of every triple, from SVOs.json or SVOs.parquet
+    # position, if given, is where to start from, and is updated as the triples are read: the greatest sentence id
+    # read, and for SVOs.json the byte offset after the last line
+    if position is None:
+        position = {'last_id': None, 'offset': 0}
+    # continuing from the position of a previous build (see load_network), the new sentences have to come after it
+    start_id = position['last_id']
+
+    if pathtojason.endswith('.parquet'):
+        # only the columns needed are read
+        for rid, subject, lemma, negated, obj in profiler.timed('read', columnar.read_triples(
+                pathtojason, columns=['id', 'subject', 'lemma', 'negated', 'object'], after_id=position['last_id'])):
+            position['last_id'] = rid if position['last_id'] is None else max(position['last_id'], rid)
+            yield subject, ('!' if negated else '') + lemma, obj
+        return
+
+    # a compressed output is appended to frame by frame, it is read up to its end
+    compressed = compression_of(pathtojason) != ''
+    size = os.path.getsize(pathtojason)
+    if size < position['offset']:
+        raise ValueError('%s is smaller than when the network was built from it' % pathtojason)
+
+    verbroots = {}
+    for line in profiler.timed('read', read_lines(pathtojason, position['offset'])):
+        row = loads(line)
+        # the outputs of older versions of main.py have no id
+        rid = row.get('id')
+        if rid is not None:
+            if start_id is not None and rid <= start_id:
+                raise ValueError('%s was rewritten since the network was built from it' % pathtojason)
+            if position['last_id'] is None or rid > position['last_id']:
+                position['last_id'] = rid
+        if not compressed:
+            position['offset'] += len(line)
 
-    def inout_search(subject):
-        for index, row in inout_file.iterrows():
-            if subject.lower().strip() == row['group_name'].lower().strip():
-                if row['group_type'] == '':
-                    raise
-                return row['group_type']
-        raise
-
-    nodesdf = pd.DataFrame(columns=['name', 'type'])
-    for row in read_SVOs(pathtojason):
         svlist = row['extended_SVO']
-        for sv in svlist:
-            nodesdf = nodesdf.append({'name': sv[0], 'type': inout_search(sv[0])}, ignore_index=True)
-            nodesdf = nodesdf.append({'name': getverbroot(sv[1]), 'type': 'verb'}, ignore_index=True)
-            nodesdf = nodesdf.append({'name': sv[2], 'type': inout_search(sv[2])}, ignore_index=True)
+        with profiler.stage('verbroots'):
+            if 'SVO_info' in row:
+                roots = svo_verbroots(row)
+            else:
+                # the same verbs come back over and over, lemmatize each of them once
+                roots = []
+                for sv in svlist:
+                    if sv[1] not in verbroots:
+                        verbroots[sv[1]] = getverbroot(sv[1])
+                    roots.append(verbroots[sv[1]])
 
-    nodesdf.drop_duplicates(subset=['name', 'type'], keep='first', inplace=True)
-    nodesdf['Id'] = range(0, nodesdf.shape[0])
-    nodesdf.to_csv('./%s/nodes.csv'%savedir, index=False)
+        for sv, verb in zip(svlist, roots):
+            yield sv[0], verb, sv[2]
 
-    nodes_subobject = nodesdf.loc[(nodesdf.type == 'ingroup') | (nodesdf.type == 'outgroup')]
-    nodes_verb = nodesdf.loc[nodesdf.type == 'verb']
+    if compressed:
+        position['offset'] = size
 
-    return nodesdf, nodes_verb, nodes_subobject
 
+def get_grouptypes(pathtoinoutfile):
+    # group name -> group type, the first row of a name wins as in the order of get_inoutinstances
+    grouptypes = {}
+    for name, grouptype in get_inoutinstances(pathtoinoutfile)[['group_name', 'group_type']].values:
+        grouptypes.setdefault(name, grouptype)
+    return grouptypes
 
-def getedges(Tnodesubjobjdict, Tnodeverbdict, nodes_subobject, pathtojason, savedir):
-    edgedic_in = {}
-    edgedic_out = {}
-    for row in read_SVOs(pathtojason):
-        svlist = row['extended_SVO']
-        for sv in svlist:
-            verb = getverbroot(sv[1])
-            subject = sv[0]
-            object = sv[2]
-
-            verbid = Tnodeverbdict[verb]
-            subjectid = Tnodesubjobjdict[subject]
-            objectid = Tnodesubjobjdict[object]
-
-            subjecttype = nodes_subobject.loc[nodes_subobject.Id == subjectid]['type'].tolist()
-            assert len(subjecttype) == 1
-
-            edge1 = str(subjectid) + '_' + str(verbid)
-            edge2 = str(verbid) + '_' + str(objectid)
-
-            if subjecttype[0] == 'ingroup':
-                if edge1 in edgedic_in:
-                    edgedic_in[edge1] += 1
-                else:
-                    edgedic_in[edge1] = 1
-                if edge2 in edgedic_in:
-                    edgedic_in[edge2] += 1
-                else:
-                    edgedic_in[edge2] = 1
-            elif subjecttype[0] == 'outgroup':
-                if edge1 in edgedic_out:
-                    edgedic_out[edge1] += 1
-                else:
-                    edgedic_out[edge1] = 1
-                if edge2 in edgedic_out:
-                    edgedic_out[edge2] += 1
-                else:
-                    edgedic_out[edge2] = 1
-            else:
-                raise
 
-    edgesdf_in = pd.DataFrame(columns=['source', 'target', 'weight'])
-    for key, value in edgedic_in.items():
-        source, target = key.split('_')
-        weight = int(value)
-        edgesdf_in = edgesdf_in.append({'source': int(source), 'target': int(target), 'weight': weight},
-                                       ignore_index=True)
-    edgesdf_in.to_csv('./%s/edges_In.csv'%savedir, index=False)
+def build_network(pathtojason, pathtoinoutfile, network=None, position=None):
+    # reads the SVOs once: the node ids are given in order of first appearance (subject, verb, object of every
+    # triple), and the edges subject -> verb and verb -> object are counted per in- or out-group subject
+    # network: (nodes, edgedic_in, edgedic_out, totaltriples) of a previous build, the triples read from position on
+    # (see read_triples) are added to; its nodes keep their ids and the new ones come after them, so the result is
+    # the same as building the network from all the triples at once
+    grouptypes = get_grouptypes(pathtoinoutfile)
 
-    edgesdf_out = pd.DataFrame(columns=['source', 'target', 'weight'])
-    for key, value in edgedic_out.items():
-        source, target = key.split('_')
-        weight = int(value)
-        edgesdf_out = edgesdf_out.append({'source': int(source), 'target': int(target), 'weight': weight},
-                                         ignore_index=True)
-    edgesdf_out.to_csv('./%s/edges_Out.csv'%savedir, index=False)
+    def inout_search(subject):
+        grouptype = grouptypes.get(subject.lower().strip())
+        if grouptype not in ('ingroup', 'outgroup'):
+            raise ValueError('%s is not an in- or out-group instance of %s' % (subject, pathtoinoutfile))
+        return grouptype
+
+    def node_id(name, nodetype):
+        key = (name, nodetype)
+        if key not in nodes:
+            nodes[key] = len(nodes)
+        return nodes[key]
+
+    if network is None:
+        network = ({}, {}, {}, 0)
+    nodes, edgedic_in, edgedic_out, totaltriples = network
+    edges = {'ingroup': edgedic_in, 'outgroup': edgedic_out}
+    for subject, verb, obj in read_triples(pathtojason, position):
+        subjecttype = inout_search(subject)
+        subjectid = node_id(subject, subjecttype)
+        verbid = node_id(verb, 'verb')
+        objectid = node_id(obj, inout_search(obj))
+
+        edgedic = edges[subjecttype]
+        edgedic[(subjectid, verbid)] = edgedic.get((subjectid, verbid), 0) + 1
+        edgedic[(verbid, objectid)] = edgedic.get((verbid, objectid), 0) + 1
+        totaltriples += 1
+
+    return nodes, edges['ingroup'], edges['outgroup'], totaltriples
+
+
+def write_network(nodes, edgedic_in, edgedic_out, savedir, compression=''):
+    # compression: '', '.gz' or '.zst', pandas compresses the csv files after their suffix
+    nodesdf = pd.DataFrame([(name, nodetype, Id) for (name, nodetype), Id in nodes.items()],
+                           columns=['name', 'type', 'Id'])
+    nodesdf.to_csv('%s/nodes.csv%s' % (savedir, compression), index=False)
+
+    edgesdf_in = pd.DataFrame([(source, target, weight) for (source, target), weight in edgedic_in.items()],
+                              columns=['source', 'target', 'weight'])
+    edgesdf_in.to_csv('%s/edges_In.csv%s' % (savedir, compression), index=False)
+
+    edgesdf_out = pd.DataFrame([(source, target, weight) for (source, target), weight in edgedic_out.items()],
+                               columns=['source', 'target', 'weight'])
+    edgesdf_out.to_csv('%s/edges_Out.csv%s' % (savedir, compression), index=False)
+
+    return nodesdf, edgesdf_in, edgesdf_out
+
+
+def state_path(savedir):
+    return '%s/network_state.json' % savedir
+
+
+def load_network(savedir, pathtojason):
+    # (network, position) of the network written in savedir, to add the triples of pathtojason extracted since then
+    # to it; (None, None) if there is none yet
+    if not os.path.exists(state_path(savedir)):
+        return None, None
+    with open(state_path(savedir), 'r') as in_file:
+        state = json.load(in_file)
+    if os.path.abspath(state['svos']) != os.path.abspath(pathtojason):
+        raise ValueError('the network of %s was built from %s, not %s' % (savedir, state['svos'], pathtojason))
+
+    nodesdf = pd.read_csv(resolve('%s/nodes.csv' % savedir), keep_default_na=False,
+                          dtype={'name': str, 'type': str})
+    nodes = dict(zip(zip(nodesdf['name'].tolist(), nodesdf['type'].tolist()), nodesdf['Id'].tolist()))
+    if sorted(nodes.values()) != list(range(len(nodes))):
+        raise ValueError('the node ids of %s/nodes.csv are not 0 to n-1' % savedir)
+
+    edgedics = []
+    for graph in ('In', 'Out'):
+        edgesdf = pd.read_csv(resolve('%s/edges_%s.csv' % (savedir, graph)))
+        edgedics.append(dict(zip(zip(edgesdf['source'].tolist(), edgesdf['target'].tolist()),
+                                 edgesdf['weight'].tolist())))
+
+    position = {'last_id': state['last_id'], 'offset': state['offset']}
+    return (nodes, edgedics[0], edgedics[1], state['totaltriples']), position
+
+
+def write_state(savedir, pathtojason, position, totaltriples):
+    # written aside and renamed once the network files are written, as the checkpoints of main.py
+    state = {'svos': pathtojason, 'last_id': position['last_id'], 'offset': position['offset'],
+             'totaltriples': totaltriples}
+    with open(state_path(savedir) + '.tmp', 'w') as out_file:
+        json.dump(state, out_file)
+    os.replace(state_path(savedir) + '.tmp', state_path(savedir))
+
+
+# type codes of the nodes in the exported arrays
+NODETYPES = ['ingroup', 'outgroup', 'verb']
+EDGE_COLUMNS = {'source': np.int32, 'target': np.int32, 'weight': np.int64}
+
+
+def export_arrays(nodes, edgedic_in, edgedic_out, savedir):
+    # the node table index: the type code of every node at its Id, the names stay in nodes.csv
+    nodetypes = np.empty(len(nodes), dtype=np.int8)
+    for (_, nodetype), Id in nodes.items():
+        nodetypes[Id] = NODETYPES.index(nodetype)
+    np.save('%s/nodes_type.npy' % savedir, nodetypes)
+
+    # the edges of every graph in COO format, one array per column so each of them can be memory mapped
+    for graph, edgedic in (('In', edgedic_in), ('Out', edgedic_out)):
+        pairs = np.array(list(edgedic.keys()), dtype=np.int32).reshape(-1, 2)
+        np.save('%s/edges_%s_source.npy' % (savedir, graph), np.ascontiguousarray(pairs[:, 0]))
+        np.save('%s/edges_%s_target.npy' % (savedir, graph), np.ascontiguousarray(pairs[:, 1]))
+        np.save('%s/edges_%s_weight.npy' % (savedir, graph),
+                np.fromiter(edgedic.values(), dtype=EDGE_COLUMNS['weight'], count=len(edgedic)))
 
-    return edgesdf_in, edgesdf_out
+
+def load_arrays(savedir, mmap=True):
+    # {'node_type': array, 'In': {'source': array, 'target': array, 'weight': array}, 'Out': {...}}
+    mmap_mode = 'r' if mmap else None
+    network = {'node_type': np.load('%s/nodes_type.npy' % savedir, mmap_mode=mmap_mode)}
+    for graph in ('In', 'Out'):
+        network[graph] = {column: np.load('%s/edges_%s_%s.npy' % (savedir, graph, column), mmap_mode=mmap_mode)
+                          for column in EDGE_COLUMNS}
+    return network
 
 
-def testnetwork(nodes, edgesdf_in, edgesdf_out, pathtojason):
-    totaledge = 0
-    for row in read_SVOs(pathtojason):
-        svolist = row['extended_SVO']
-        totaledge += len(svolist)
+def to_sparse(network, graph):
+    # scipy is only needed for the sparse matrix, not for exporting or loading the arrays
+    from scipy.sparse import coo_matrix
+    n = len(network['node_type'])
+    edges = network[graph]
+    return coo_matrix((edges['weight'], (edges['source'], edges['target'])), shape=(n, n))
 
-    assert totaledge * 2 == edgesdf_in['weight'].sum() + edgesdf_out['weight'].sum()
 
-    for index, row in edgesdf_in.iterrows():
-        type1 = nodes.loc[nodes.Id == row['source']]['type'].tolist()[0]
-        if not (type1 == 'ingroup' or type1 == 'verb'):
-            print(index, row)
+def testnetwork(nodes, edgedic_in, edgedic_out, totaltriples):
+    # every triple gives two edges
+    assert totaltriples * 2 == sum(edgedic_in.values()) + sum(edgedic_out.values())
 
-    for index, row in edgesdf_out.iterrows():
-        type1 = nodes.loc[nodes.Id == row['source']]['type'].tolist()[0]
+    nodetypes = {Id: nodetype for (_, nodetype), Id in nodes.items()}
+    for (source, target), weight in edgedic_in.items():
+        if not (nodetypes[source] == 'ingroup' or nodetypes[source] == 'verb'):
+            print('in-group edge from a %s node' % nodetypes[source], source, target, weight)
 
-        if not (type1 == 'outgroup' or type1 == 'verb'):
-            print(index, row)
+    for (source, target), weight in edgedic_out.items():
+        if not (nodetypes[source] == 'outgroup' or nodetypes[source] == 'verb'):
+            print('out-group edge from a %s node' % nodetypes[source], source, target, weight)
 
 
 def main(args):
-    nodesdf, nodes_verb, nodes_subobject = getnodes(args.json_dir + args.jsonfile + '.json',
-                                                    args.data_dir + args.inoutfile + '.csv', args.save_dir)
-
-    nodeverbdict = dict(nodes_verb[['Id', 'name']].values)
-    nodesubjobjdict = dict(nodes_subobject[['Id', 'name']].values)
-
-    Tnodesubjobjdict = {value: key for key, value in nodesubjobjdict.items()}
-    Tnodeverbdict = {value: key for key, value in nodeverbdict.items()}
-
-    edgesdf_in, edgesdf_out = getedges(Tnodesubjobjdict, Tnodeverbdict, nodes_subobject,
-                                       args.json_dir + args.jsonfile + '.json', args.save_dir)
-
-    testnetwork(nodesdf, edgesdf_in, edgesdf_out, args.json_dir + args.jsonfile + '.json')
+    # here rather than on import, so the modules using build_network (e.g. benchmark.py) don't go online
+    nltk.download('wordnet')
+    set_profile(args.model_profile)
+    set_json_codec(args.json_codec)
+    if args.profile:
+        profiler.enable()
+
+    # SVOs.json may be compressed (SVOs.json.gz, SVOs.json.zst), as the csv files
+    pathtojason = resolve(args.json_dir + args.jsonfile + args.format)
+
+    # the network built by a previous run, and where it stopped reading the SVOs
+    network, position = None, None
+    if args.incremental:
+        with profiler.stage('load'):
+            network, position = load_network(args.save_dir, pathtojason)
+    if position is None:
+        position = {'last_id': None, 'offset': 0}
+
+    with profiler.stage('build'):
+        nodes, edgedic_in, edgedic_out, totaltriples = build_network(
+            pathtojason, resolve(args.data_dir + args.inoutfile + '.csv'), network, position)
+    with profiler.stage('write'):
+        write_network(nodes, edgedic_in, edgedic_out, args.save_dir, compression=COMPRESSIONS[args.compress])
+        write_state(args.save_dir, pathtojason, position, totaltriples)
+    if args.export_arrays:
+        with profiler.stage('export arrays'):
+            export_arrays(nodes, edgedic_in, edgedic_out, args.save_dir)
+
+    with profiler.stage('test'):
+        testnetwork(nodes, edgedic_in, edgedic_out, totaltriples)
+
+    profiler.write_summary('%s/profile_network.json' % args.save_dir)
 
 
 if __name__ == '__main__':
@@ -172,6 +301,12 @@ if __name__ == '__main__':
                         type=str,
                         help="name of the json file which contains the SVO triples.")
 
+    parser.add_argument("--format",
+                        default='.json',
+                        choices=['.json', '.parquet'],
+                        help="extension of the SVO file, .parquet being the columnar output of main.py "
+                             "--output_format parquet.")
+
     parser.add_argument("--inoutfile",
                         default='NSM_ingroups_outgroups',
                         type=str,
@@ -182,6 +317,36 @@ if __name__ == '__main__':
                         type=str,
                         help="path to saving directory.")
 
+    parser.add_argument("--model_profile", "--model-profile",
+                        default=DEFAULT_PROFILE,
+                        choices=list(PROFILES),
+                        help="spaCy model used for the verb lemmas.")
+
+    parser.add_argument("--export_arrays",
+                        action='store_true',
+                        help="also save the node types and the COO source/target/weight of both graphs as .npy "
+                             "arrays, which load_arrays memory maps.")
+
+    parser.add_argument("--incremental",
+                        action='store_true',
+                        help="add the triples extracted since the last run to the network of the saving directory "
+                             "(see network_state.json) instead of building it again; the ids of its nodes are kept.")
+
+    parser.add_argument("--compress",
+                        default='none',
+                        choices=list(COMPRESSIONS),
+                        help="write nodes.csv.gz, edges_In.csv.gz, ... (or .zst) instead of the plain csv files.")
+
+    parser.add_argument("--json_codec",
+                        default='json',
+                        choices=['json', 'orjson'],
+                        help="decoder of SVOs.json, orjson being faster.")
+
+    parser.add_argument("--profile",
+                        action='store_true',
+                        help="record the time, number of calls and memory of every stage, and write them to "
+                             "profile_network.json in the saving directory.")
+
     args = parser.parse_args()
 
     main(args)
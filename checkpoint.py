@@ -0,0 +1,73 @@
+import json
+import os
+
+from fileio import compression_of, loads, open_file
+
+
+# the checkpoint of an output file records the id of the last row processed and the size of the output at that
+# point, so a run can be resumed (or extended with new rows) from a consistent state
+def checkpoint_path(outpath):
+    return outpath + '.ckpt'
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as in_file:
+        return json.load(in_file)
+
+
+def write_checkpoint(path, out_file, last_id, complete=False):
+    # the output has to be on disk before the checkpoint pointing to it
+    out_file.flush()
+    os.fsync(out_file.fileno())
+    checkpoint = {'last_id': last_id, 'offset': out_file.tell(), 'complete': complete}
+
+    # written aside and renamed, so a crash never leaves a half written checkpoint
+    with open(path + '.tmp', 'w') as ckpt_file:
+        json.dump(checkpoint, ckpt_file)
+    os.replace(path + '.tmp', path)
+
+
+def high_water_mark(outpath):
+    # for outputs written without a checkpoint: the id of the last record and the size of the complete records
+    last_id = None
+    offset = 0
+    if compression_of(outpath):
+        # a compressed output can't be cut after a record, it has to be complete
+        try:
+            with open_file(outpath, 'rb') as in_file:
+                for line in in_file:
+                    last_id = loads(line)['id']
+        except EOFError:
+            raise ValueError('%s is truncated and has no checkpoint to resume from' % outpath)
+        return last_id, os.path.getsize(outpath)
+
+    with open(outpath, 'rb') as in_file:
+        for line in in_file:
+            if not line.endswith(b'\n'):
+                break
+            last_id = loads(line)['id']
+            offset += len(line)
+    return last_id, offset
+
+
+def recover(outpath, incremental=False):
+    # (last id processed, offset to truncate the output to) to continue from, or (None, 0) to start from scratch
+    checkpoint = read_checkpoint(checkpoint_path(outpath))
+    if checkpoint is not None:
+        # a checkpoint past the end of the output doesn't belong to it (e.g. the output was written again since)
+        size = os.path.getsize(outpath) if os.path.exists(outpath) else 0
+        if checkpoint['offset'] > size:
+            raise ValueError('the checkpoint of %s points past its end (%d > %d bytes), it is not the one of this '
+                             'output' % (outpath, checkpoint['offset'], size))
+        if not checkpoint['complete'] and incremental:
+            print('the previous run of %s did not complete, it is resumed first' % outpath)
+        return checkpoint['last_id'], checkpoint['offset']
+
+    if incremental:
+        if os.path.exists(outpath):
+            return high_water_mark(outpath)
+        return None, 0
+
+    raise FileNotFoundError('no checkpoint to resume %s from' % outpath)
@@ -0,0 +1,87 @@
+import argparse
+import http.client
+import json
+import socket
+from urllib.parse import urlparse
+
+
+# http.client connection over a unix socket
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method, path, payload=None, url='http://127.0.0.1:8080', socket_path=None, timeout=60):
+    if socket_path:
+        connection = UnixHTTPConnection(socket_path, timeout=timeout)
+    else:
+        parsed = urlparse(url)
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        result = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise RuntimeError('%d: %s' % (response.status, result.get('error')))
+    return result
+
+
+def extract(sentences, url='http://127.0.0.1:8080', socket_path=None):
+    # sentences: strings, or {"id": ..., "sentence": ...}; returns the records of SVOs.json, one per sentence
+    return request('POST', '/extract', {'sentences': sentences}, url, socket_path)['results']
+
+
+def stats(url='http://127.0.0.1:8080', socket_path=None):
+    return request('GET', '/stats', url=url, socket_path=socket_path)
+
+
+def main(args):
+    if args.stats:
+        print(json.dumps(stats(args.url, args.socket), indent=2))
+        return
+
+    sentences = list(args.sentences)
+    if args.file:
+        with open(args.file, 'r') as in_file:
+            sentences.extend(line.strip() for line in in_file if line.strip())
+    for record in extract(sentences, args.url, args.socket):
+        print(json.dumps(record))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("sentences",
+                        nargs='*',
+                        help="sentences to extract the SVOs of.")
+
+    parser.add_argument("--file",
+                        default=None,
+                        type=str,
+                        help="text file with one sentence per line, sent after the sentences given as arguments.")
+
+    parser.add_argument("--url",
+                        default='http://127.0.0.1:8080',
+                        type=str,
+                        help="address of the service started with server.py.")
+
+    parser.add_argument("--socket",
+                        default=None,
+                        type=str,
+                        help="unix socket of the service, instead of its address.")
+
+    parser.add_argument("--stats",
+                        action='store_true',
+                        help="print the request counts, p50/p99 latency and queue depth of the service instead.")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,61 @@
+# columnar (parquet) output of the extraction: one row per triple instead of one json record per sentence, written in
+# row groups as the run goes. pyarrow is only needed for this format, so it is imported on first use
+
+# the verb is written as in extended_SVO, i.e. with a leading '!' when negated
+COLUMNS = ['id', 'pid', 'subject', 'verb', 'lemma', 'object', 'negated']
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([('id', pa.int64()),
+                      ('pid', pa.string()),
+                      ('subject', pa.string()),
+                      ('verb', pa.string()),
+                      ('lemma', pa.string()),
+                      ('object', pa.string()),
+                      ('negated', pa.bool_())])
+
+
+class TripleWriter:
+    def __init__(self, path, row_group_size=100000):
+        import pyarrow.parquet as pq
+        self.schema = _schema()
+        self.row_group_size = row_group_size
+        self.columns = {column: [] for column in COLUMNS}
+        # the groups and verbs repeat a lot, dictionary encoded and compressed they take little space
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def add(self, rid, pid, extended_SVO, SVO_info):
+        # the triples of a sentence, SVO_info being the structured details of extended_SVO (see main.extended_SVOs)
+        for (subject, verb, obj), info in zip(extended_SVO, SVO_info):
+            self.columns['id'].append(rid)
+            self.columns['pid'].append(None if pid is None else str(pid))
+            self.columns['subject'].append(subject)
+            self.columns['verb'].append(verb)
+            self.columns['lemma'].append(info['lemma'])
+            self.columns['object'].append(obj)
+            self.columns['negated'].append(info['negated'])
+        if len(self.columns['id']) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+        if self.columns['id']:
+            self.writer.write_table(pa.table(self.columns, schema=self.schema), row_group_size=self.row_group_size)
+            self.columns = {column: [] for column in COLUMNS}
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def read_triples(path, columns=COLUMNS, batch_size=65536, after_id=None):
+    # yields the triples as tuples of the given columns, only these columns being read, one batch of rows at a time
+    # after_id: only the triples of the sentences with a greater id, the row groups without any are not read
+    import pyarrow.parquet as pq
+    if after_id is None:
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)
+    else:
+        batches = pq.read_table(path, columns=columns, filters=[('id', '>', after_id)]).to_batches(batch_size)
+    for batch in batches:
+        yield from zip(*(batch.column(batch.schema.get_field_index(column)).to_pylist() for column in columns))
@@ -0,0 +1,123 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+
+from fileio import resolve
+from main import readfile, cleaning, filter, get_row_ids, parse_sentences, extract_sentence
+from lexicon import LexiconMatcher
+from models import PROFILES, get_nlp, set_profile
+from utils import get_inoutinstances
+
+
+def read_sample(pathtofile, lexicon, sample):
+    # the same cleaning and filtering as main.py, on the first sentences of the corpus
+    df = readfile(pathtofile)
+    df.sentence = df.sentence.apply(lambda x: cleaning(x))
+    df = df[df['sentence'].apply(lambda x: filter(x, lexicon))].head(sample)
+    return list(zip(get_row_ids(df), (sen.lower().strip() for sen in df['sentence'])))
+
+
+def run_profile(profile, rows, inoutlabels, batch_size):
+    # runs in a fresh process, so the peak memory is the one of this profile only
+    set_profile(profile)
+    lexicon = LexiconMatcher(inoutlabels)
+
+    start = time.perf_counter()
+    get_nlp()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    triples = {}
+    for rid, _, tokens in parse_sentences(rows, batch_size=batch_size, length_buckets=[8, 16, 32, 64]):
+        triples[rid] = [list(t) for t in extract_sentence(tokens, lexicon)['extended_SVO']]
+    extract_time = time.perf_counter() - start
+
+    return {'profile': profile,
+            'model': PROFILES[profile],
+            'sentences': len(rows),
+            'load_sec': load_time,
+            'sentences_per_sec': len(rows) / extract_time if extract_time > 0 else float('inf'),
+            # ru_maxrss is in kilobytes on linux
+            'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'triples': triples}
+
+
+def count_differences(triples, baseline):
+    # number of extended_SVO triples found by only one of the two runs
+    diff = 0
+    for rid in baseline:
+        diff += len(set(map(tuple, triples.get(rid, []))) ^ set(map(tuple, baseline[rid])))
+    return diff
+
+
+def main(args):
+    # either file may be compressed (.gz, .zst), as for main.py
+    inoutlabels = get_inoutinstances(resolve(args.data_dir + args.inoutfile + '.csv')).group_name.tolist()
+    rows = read_sample(resolve(args.data_dir + args.datafile + '.csv'), LexiconMatcher(inoutlabels), args.sample)
+
+    profiles = args.profiles.split(',')
+    if 'lg' not in profiles:
+        profiles.append('lg')
+
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for profile in profiles:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_profile, (profile, rows, inoutlabels, args.batch_size)))
+
+    baseline = [r for r in results if r['profile'] == 'lg'][0]['triples']
+    baseline_count = sum(len(t) for t in baseline.values())
+
+    print('%-8s %12s %12s %14s %16s' % ('profile', 'load (s)', 'sents/sec', 'peak mem (MB)', 'triples diff lg'))
+    for r in results:
+        r['triples_total'] = sum(len(t) for t in r['triples'].values())
+        r['triples_diff_lg'] = count_differences(r.pop('triples'), baseline)
+        print('%-8s %12.1f %12.1f %14.0f %10d / %d' % (r['profile'], r['load_sec'], r['sentences_per_sec'],
+                                                        r['peak_memory_mb'], r['triples_diff_lg'], baseline_count))
+
+    with open(args.save_dir + 'profile_report.json', 'w') as out_file:
+        json.dump(results, out_file, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--data_dir",
+                        default='./data/',
+                        type=str,
+                        help="The input data dir. Should contain the .csv files for the task.")
+
+    parser.add_argument("--datafile",
+                        default='NSM_corpus_cleaned',
+                        type=str,
+                        help="name of the csv file the sample sentences are taken from.")
+
+    parser.add_argument("--inoutfile",
+                        default='NSM_ingroups_outgroups',
+                        type=str,
+                        help="name of the csv file which contains in- and out-group instances.")
+
+    parser.add_argument("--save_dir",
+                        default='./save/',
+                        type=str,
+                        help="path to saving directory, the report is written to profile_report.json.")
+
+    parser.add_argument("--profiles",
+                        default='sm,md,lg',
+                        type=str,
+                        help="comma separated model profiles to compare, lg is always run as the baseline.")
+
+    parser.add_argument("--sample",
+                        default=2000,
+                        type=int,
+                        help="number of sentences (after filtering) used for the comparison.")
+
+    parser.add_argument("--batch_size",
+                        default=64,
+                        type=int,
+                        help="number of sentences parsed together with nlp.pipe.")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,127 @@
+import gzip
+import io
+import json
+import os
+
+
+# the files with these suffixes are (de)compressed on the fly, as streams. zstandard is only needed for .zst files,
+# and orjson only for the orjson codec, so both are imported on first use
+COMPRESSIONS = {'none': '', 'gz': '.gz', 'zst': '.zst'}
+
+
+def compression_of(path):
+    for suffix in ('.gz', '.zst'):
+        if path.endswith(suffix):
+            return suffix
+    return ''
+
+
+def resolve(path):
+    # the path itself, or its compressed version when only that one exists
+    if not os.path.exists(path):
+        for suffix in ('.gz', '.zst'):
+            if os.path.exists(path + suffix):
+                return path + suffix
+    return path
+
+
+def open_file(path, mode='r', newline=None):
+    # like open(), 'r', 'w', 'rb' or 'wb', text being utf-8
+    compression = compression_of(path)
+    text = 'b' not in mode
+    if compression == '.gz':
+        if text:
+            return gzip.open(path, mode + 't', encoding='utf-8', newline=newline)
+        return gzip.open(path, mode)
+
+    if compression == '.zst':
+        import zstandard
+        if mode.startswith('r'):
+            # the outputs are written as several frames, see FrameWriter
+            stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'),
+                                                                                 read_across_frames=True))
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+        if text:
+            return io.TextIOWrapper(stream, encoding='utf-8', newline=newline)
+        return stream
+
+    if text:
+        return open(path, mode, encoding='utf-8', newline=newline)
+    return open(path, mode)
+
+
+def read_lines(path, offset=0):
+    # yields the complete lines of a file from a byte offset of the file on, which has to be the start of a line, or
+    # for a compressed file the start of a gzip member or zstd frame (as FrameWriter leaves it after every frame)
+    compression = compression_of(path)
+    with open(path, 'rb') as raw:
+        raw.seek(offset)
+        if compression == '.gz':
+            stream = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif compression == '.zst':
+            import zstandard
+            stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True,
+                                                                                 closefd=False))
+        else:
+            stream = raw
+        for line in stream:
+            # the last line may still be being written
+            if not line.endswith(b'\n'):
+                break
+            yield line
+
+
+# writes bytes to a file opened in binary mode, compressed as independent gzip members or zstd frames if its path ends
+# with .gz or .zst. Once end_frame() completed the current member, the file is valid up to its current position, so
+# a checkpoint can point there, and more members can be appended after it
+class FrameWriter:
+    def __init__(self, raw, path):
+        self.raw = raw
+        self.compression = compression_of(path)
+        self._stream = None
+
+    def write(self, data):
+        if not self.compression:
+            self.raw.write(data)
+            return
+        if self._stream is None:
+            if self.compression == '.gz':
+                # closing the member doesn't close raw
+                self._stream = gzip.GzipFile(fileobj=self.raw, mode='wb', mtime=0)
+            else:
+                import zstandard
+                self._stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+        self._stream.write(data)
+
+    def end_frame(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+# codec of the json lines outputs (SVOs.json): both give the same records, orjson is faster but writes them without
+# the spaces of json.dumps and with non-ascii characters unescaped
+_orjson = None
+
+
+def set_json_codec(codec):
+    global _orjson
+    if codec == 'orjson':
+        import orjson
+        _orjson = orjson
+    else:
+        _orjson = None
+
+
+def dumps_line(record):
+    # the record as a line of bytes
+    if _orjson is not None:
+        return _orjson.dumps(record) + b'\n'
+    return (json.dumps(record) + '\n').encode('utf-8')
+
+
+def loads(line):
+    if _orjson is not None:
+        return _orjson.loads(line)
+    return json.loads(line)
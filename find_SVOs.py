@@ -1,13 +1,11 @@
 
 import re
 
-import en_core_web_lg
 from collections.abc import Iterable
+from spacy.tokens import Span, Token
 
-from utils import passive_phrases, is_in_matches
-
-# use spacy large model
-nlp = en_core_web_lg.load()
+from models import get_nlp
+from utils import set_passive_spans, in_passive
 
 # dependency markers for subjects
 SUBJECTS = {"nsubj", "nsubjpass", "csubj", "csubjpass", "agent", "expl"}
@@ -17,6 +15,8 @@ OBJECTS = {"dobj", "dative", "attr", "oprd"}
 BREAKER_POS = {"CCONJ", "VERB"}
 # words that are negations
 NEGATIONS = {"no", "not", "n't", "never", "none"}
+# "not only ... but" is not a negation
+NOT_ONLY = re.compile(r'(not only)((\w+|\,)? ?){0,4}( ?but)?')
 
 # dependency tags for conjunctive verbs
 CONJ = ["cc", "conj"]
@@ -125,11 +125,9 @@ def _find_subs(tok):
 # is the tok set's left or right negated?
 def _is_negated(tok):
     parts = list(tok.lefts) + list(tok.rights)
-    for dep in parts:
-        if dep.lower_ in NEGATIONS and not re.findall('(not only)((\w+|\,)? ?){0,4}( ?but)?',
-                                                      ' '.join([str(item) for item in parts])):
-            return True
-    return False
+    if not any(dep.lower_ in NEGATIONS for dep in parts):
+        return False
+    return not NOT_ONLY.findall(' '.join([str(item) for item in parts]))
 
 
 # get grammatical objects for a given set of dependencies (including passive sentences)
@@ -277,14 +275,14 @@ def _get_that_resolution(toks):
 
 # simple stemmer using lemmas
 def _get_lemma(word: str):
-    tokens = nlp(word)
+    tokens = get_nlp('lemma')(word)
     if len(tokens) == 1:
         return tokens[0].lemma_
     return word
 
 
 # expand an obj / subj np using its chunk
-def expand(item, tokens):
+def expand(item, tokens, context=None):
     if item.lower_ == 'that':
         temp_item = _get_that_resolution(tokens)
         if temp_item is not None:
@@ -315,7 +313,7 @@ def expand(item, tokens):
     if hasattr(parts[-1], 'rights'):
         for item2 in parts[-1].rights:
             if item2.pos_ == "DET" or item2.pos_ == "NOUN" or item2.pos_ == "PROPN":
-                parts.extend(expand(item2, tokens))
+                parts.extend(context.expand(item2) if context else expand(item2, tokens))
             break
 
     for i, tok in enumerate(parts):
@@ -323,13 +321,15 @@ def expand(item, tokens):
             parts.remove(tok)
             del indexs[i]
     if str(parts[-1]) == 'of':
-        indchunks = {}
-        for np in tokens.noun_chunks:
-            indchunks[np.start] = np.text
+        # the noun chunk right after 'of', as a span of the doc
         index = indexs[-1] + 1
-        if index in indchunks:
-            parts.append(nlp(indchunks[indexs[-1] + 1]))
-            indexs.append(indexs[-1] + 1)
+        if context:
+            chunk = context.chunk_at(index)
+        else:
+            chunk = {np.start: np for np in tokens.noun_chunks}.get(index)
+        if chunk is not None:
+            parts.append(chunk)
+            indexs.append(index)
 
     return parts
 
@@ -342,17 +342,113 @@ def to_str(tokens):
         return ''
 
 
-def findSVOs(tokens):
+# token and character offsets [start, end) in the doc covered by the parts of an expanded phrase
+def _offsets(parts, tokens):
+    toks = []
+    for part in parts:
+        if isinstance(part, Token) and part.doc is tokens:
+            toks.append(part)
+        elif isinstance(part, Span) and part.doc is tokens:
+            toks.extend(part)
+    if len(toks) == 0:
+        return None
+    first = min(toks, key=lambda tok: tok.i)
+    last = max(toks, key=lambda tok: tok.i)
+    return [first.i, last.i + 1, first.idx, last.idx + len(last)]
+
+
+# what findSVOs computes about the tokens of a doc, kept so every subject, object and noun chunk is analysed once
+# however many triples it takes part in
+class DocContext:
+    def __init__(self, tokens, lexicon=None):
+        self.tokens = tokens
+        self.lexicon = lexicon
+        self._starts = None
+        self._chunks = None
+        self._expanded = {}
+        self._phrases = {}
+        self._negated = {}
+
+    def chunk_at(self, start):
+        if self._chunks is None:
+            self._chunks = {np.start: np for np in self.tokens.noun_chunks}
+        return self._chunks.get(start)
+
+    def expand(self, item):
+        # the returned list is shared, callers must not modify it
+        if item.i not in self._expanded:
+            self._expanded[item.i] = expand(item, self.tokens, self)
+        return self._expanded[item.i]
+
+    def phrase(self, item):
+        if item.i not in self._phrases:
+            self._phrases[item.i] = to_str(self.expand(item))
+        return self._phrases[item.i]
+
+    def is_negated(self, tok):
+        if tok.i not in self._negated:
+            self._negated[tok.i] = _is_negated(tok)
+        return self._negated[tok.i]
+
+    def may_mention(self, item):
+        # can the expanded phrase of item match a group of the lexicon? the phrase is made of tokens of the subtree
+        # of item, plus the noun chunk after an 'of', or of anywhere in the doc when a 'that' is resolved
+        if self.lexicon is None:
+            return True
+        if self._starts is None:
+            self._starts = [self.lexicon.starts_label(tok.text) for tok in self.tokens]
+
+        start = item.left_edge.i
+        end = item.right_edge.i + 1
+        for tok in self.tokens[start:end]:
+            if tok.lower_ == 'that':
+                return True
+            if tok.lower_ == 'of':
+                chunk = self.chunk_at(tok.i + 1)
+                if chunk is not None:
+                    end = max(end, chunk.end)
+        return any(self._starts[start:end])
+
+
+# build a triple, either as plain strings or with the details of the verb and the offsets of the phrases in the doc
+def _make_svo(sub, verb, verb_str, obj, negated, context, structured):
+    svo = (context.phrase(sub), "!" + verb_str if negated else verb_str, context.phrase(obj))
+    if not structured:
+        return svo
+
+    tokens = context.tokens
+    sub_parts = context.expand(sub)
+    obj_parts = context.expand(obj)
+
+    return {'subject': svo[0],
+            'verb': svo[1],
+            'object': svo[2],
+            'lemma': verb.lemma_,
+            'pos': verb.pos_,
+            'negated': negated,
+            'subject_span': _offsets(sub_parts, tokens),
+            'verb_span': _offsets([verb], tokens),
+            'object_span': _offsets(obj_parts, tokens)}
+
+
+# with structured=True the triples are returned as dicts (see _make_svo) instead of (subject, verb, object) strings
+# with a lexicon (LexiconMatcher), only the pairs where both the subject and the object can be a group mention are
+# expanded and returned; the others would be dropped by the filtering of the triples anyway
+def findSVOs(tokens, structured=False, lexicon=None):
     svos = []
-    seenverbs = []
+    seenverbs = set()
+    context = DocContext(tokens, lexicon)
 
     verbs, verbs_id = _find_verbs(tokens)
-    is_pas, _, m_indexes = passive_phrases(tokens)
+    # the passive spans are set by the passive_phrases component, unless the doc didn't go through it
+    if tokens._.passive_spans is None:
+        set_passive_spans(tokens)
+    is_pas = len(tokens._.passive_spans) > 0
 
     for v, vid in zip(verbs, verbs_id):
         if vid in seenverbs:
             continue
-        seenverbs.append(vid)
+        seenverbs.add(vid)
 
         subs, verbNegated = _get_all_subs(v)
 
@@ -361,42 +457,36 @@ def findSVOs(tokens):
 
         # hopefully there are subs, if not, don't examine this verb any longer
         if len(subs) > 0:
+            # the objects are still looked for, the verbs they are found through shouldn't be examined again
+            subs = [sub for sub in subs if context.may_mention(sub)]
             # multiple verbs
             isConjVerb, conjV = _right_of_verb_is_conj_verb(v)
             if isConjVerb:
-                v2, _, objs = _get_all_objs(conjV, is_in_matches(m_indexes, vid))
-                seenverbs.append(v2.i)
+                v2, _, objs = _get_all_objs(conjV, in_passive(tokens, vid))
+                seenverbs.add(v2.i)
+                objs = [obj for obj in objs if context.may_mention(obj)]
                 for sub in subs:
                     for obj in objs:
-                        objNegated = _is_negated(obj)
-                        if is_pas and is_in_matches(m_indexes, vid):  # reverse object / subject for passive
-                            svos.append((to_str(expand(obj, tokens)),
-                                         "!" + v.lemma_ if verbNegated or objNegated else v.lemma_,
-                                         to_str(expand(sub, tokens))))
-                            svos.append((to_str(expand(obj, tokens)),
-                                         "!" + v2.lemma_ if verbNegated or objNegated else v2.lemma_,
-                                         to_str(expand(sub, tokens))))
+                        objNegated = context.is_negated(obj)
+                        negated = verbNegated or objNegated
+                        if is_pas and in_passive(tokens, vid):  # reverse object / subject for passive
+                            svos.append(_make_svo(obj, v, v.lemma_, sub, negated, context, structured))
+                            svos.append(_make_svo(obj, v2, v2.lemma_, sub, negated, context, structured))
                         else:
-                            svos.append((to_str(expand(sub, tokens)),
-                                         "!" + v.lower_ if verbNegated or objNegated else v.lower_,
-                                         to_str(expand(obj, tokens))))
-                            svos.append((to_str(expand(sub, tokens)),
-                                         "!" + v2.lower_ if verbNegated or objNegated else v2.lower_,
-                                         to_str(expand(obj, tokens))))
+                            svos.append(_make_svo(sub, v, v.lower_, obj, negated, context, structured))
+                            svos.append(_make_svo(sub, v2, v2.lower_, obj, negated, context, structured))
 
             else:
-                v, is_pas, objs = _get_all_objs(v, is_in_matches(m_indexes, vid))
-                seenverbs.append(v.i)
+                v, is_pas, objs = _get_all_objs(v, in_passive(tokens, vid))
+                seenverbs.add(v.i)
+                objs = [obj for obj in objs if context.may_mention(obj)]
                 for sub in subs:
                     for obj in objs:
-                        objNegated = _is_negated(obj)
-                        if is_pas and is_in_matches(m_indexes, vid):  # reverse object / subject for passive
-                            svos.append((to_str(expand(obj, tokens)),
-                                         "!" + v.lemma_ if verbNegated or objNegated else v.lemma_,
-                                         to_str(expand(sub, tokens))))
+                        objNegated = context.is_negated(obj)
+                        negated = verbNegated or objNegated
+                        if is_pas and in_passive(tokens, vid):  # reverse object / subject for passive
+                            svos.append(_make_svo(obj, v, v.lemma_, sub, negated, context, structured))
                         else:
-                            svos.append((to_str(expand(sub, tokens)),
-                                         "!" + v.lower_ if verbNegated or objNegated else v.lower_,
-                                         to_str(expand(obj, tokens))))
+                            svos.append(_make_svo(sub, v, v.lower_, obj, negated, context, structured))
 
     return svos
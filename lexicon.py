@@ -0,0 +1,154 @@
+import re
+from collections import deque
+
+
+# suffixes an in- or out-group instance may carry in a phrase, e.g. muslim(s), jew(s), mujahid(in)
+SUFFIXES = ('', 's', 'i', 'in', 'es')
+
+# key of the label stored in a trie node
+END = None
+
+
+def clean_phrase(s):
+    symbols = r'(#|&|:|"|\?)'
+    WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
+    s = re.sub(symbols, ' ', s)
+    s = re.sub(WHITESPACEREGEX, ' ', s)
+    return s.strip()
+
+
+# Aho-Corasick automaton over characters, finding which of the patterns occur as substrings of a sentence
+# out[state] holds the indexes of the patterns ending at that state
+def _build_automaton(patterns):
+    goto = [{}]
+    fail = [0]
+    out = [()]
+    for index, pattern in enumerate(patterns):
+        state = 0
+        for ch in pattern:
+            nxt = goto[state].get(ch)
+            if nxt is None:
+                nxt = len(goto)
+                goto.append({})
+                fail.append(0)
+                out.append(())
+                goto[state][ch] = nxt
+            state = nxt
+        out[state] = out[state] + (index,)
+
+    # breadth first, so the failure state of a node is always computed before its children
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, nxt in goto[state].items():
+            queue.append(nxt)
+            f = fail[state]
+            while f and ch not in goto[f]:
+                f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0)
+            out[nxt] = out[nxt] + out[fail[nxt]]
+
+    return goto, fail, out
+
+
+# precompiled matcher over the in- and out-group instances
+# the labels are expected in the order of get_inoutinstances (more words first, then longer first), which breaks the
+# ties between labels matching at the same position. Every label is expanded with the SUFFIXES of its last word and
+# stored in a trie over words, so matching a phrase costs time proportional to its length, not to the lexicon size
+class LexiconMatcher:
+    def __init__(self, inoutlabels):
+        self.labels = list(inoutlabels)
+
+        self.trie = {}
+        for rank, label in enumerate(self.labels):
+            words = label.split(' ')
+            for suffix in SUFFIXES:
+                node = self.trie
+                for word in words[:-1] + [words[-1] + suffix]:
+                    node = node.setdefault(word, {})
+                # keep the label coming first in the lexicon
+                if node.get(END) is None or rank < node[END]:
+                    node[END] = rank
+
+        self.automaton = _build_automaton(self.labels)
+
+        # the words of the labels, every label being looked at when its longest word is found
+        self.words = sorted({word for label in self.labels for word in label.split(' ')})
+        word_index = {word: index for index, word in enumerate(self.words)}
+        self.labels_by_word = [[] for _ in self.words]
+        for label in set(self.labels):
+            words = [word_index[word] for word in set(label.split(' '))]
+            trigger = max(words, key=lambda index: len(self.words[index]))
+            self.labels_by_word[trigger].append(words)
+        self.word_automaton = _build_automaton(self.words)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _first_rank(self, words):
+        # scan the start positions from left to right, and return the first label matching at the leftmost one
+        for start in range(len(words)):
+            best = None
+            node = self.trie
+            for word in words[start:]:
+                node = node.get(word)
+                if node is None:
+                    break
+                rank = node.get(END)
+                if rank is not None and (best is None or rank < best):
+                    best = rank
+            if best is not None:
+                return best
+        return None
+
+    def matches(self, phrase):
+        # does any label (with its suffix variants) occur in the phrase as whole words?
+        return self._first_rank(clean_phrase(phrase).split(' ')) is not None
+
+    def starts_label(self, text):
+        # does the text hold the first word of a label (with its suffix variants for one word labels)?
+        # a phrase can only match a label if one of its tokens does
+        return any(word in self.trie for word in clean_phrase(text).split(' '))
+
+    def first_group(self, phrase):
+        # the label occurring first in the phrase, ties broken by the order of the lexicon
+        rank = self._first_rank(clean_phrase(phrase).split(' '))
+        if rank is None:
+            return None
+        return self.labels[rank]
+
+    def mentioned_in(self, sen):
+        # does any label occur in the sentence as a substring?
+        goto, fail, out = self.automaton
+        state = 0
+        if out[state]:
+            return True
+        for ch in sen:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                return True
+        return False
+
+    def distinct_groups(self, sen, limit=2):
+        # number of distinct labels (counting up to limit) all the words of which occur in the sentence
+        # the subject and object phrases are made of the tokens of the sentence, so this is an upper bound on the
+        # number of distinct groups the triples extracted from it can be matched to
+        goto, fail, out = self.word_automaton
+        found = set()
+        state = 0
+        for ch in sen:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found.update(out[state])
+
+        count = 0
+        for trigger in found:
+            for words in self.labels_by_word[trigger]:
+                if all(word in found for word in words):
+                    count += 1
+                    if count >= limit:
+                        return count
+        return count
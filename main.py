@@ -1,26 +1,51 @@
 import argparse
+import multiprocessing
+import os
 import pandas as pd
-import json
 import re
+from collections import deque
+from contextlib import ExitStack
+from itertools import count, groupby, islice
 
-from find_SVOs import findSVOs, nlp
+from checkpoint import checkpoint_path, recover, write_checkpoint
+from columnar import TripleWriter
+from fileio import COMPRESSIONS, FrameWriter, dumps_line, resolve, set_json_codec
+from find_SVOs import findSVOs
+from lexicon import LexiconMatcher
+from models import PROFILES, DEFAULT_PROFILE, get_nlp, get_profile, set_profile
+from parsecache import ParseStore, ParseWriter, parse_dir, read_chunk
+import profiler
+from sharding import parse_shard, shard_of, svo_filename
+from svocache import SVOCache, fingerprint
 from utils import boolregex, _is_aux_verb, get_inout_grp, postproverb, mergesubtokens, get_inoutinstances
 
 
 def readfile(path):
     try:
-        df = pd.read_csv(path)
+        # compressed files (.gz, .zst) are decompressed as they are read
+        df = pd.read_csv(resolve(path))
         return df
     except:
         print('file is not found')
         raise
 
 
-def filter(sen, inoutlabels):
-    for phrase in inoutlabels:
-        if phrase in sen.lower().strip():
-            return True
-    return False
+def readfile_chunks(path, chunk_size=10000):
+    # the rows of the file as dataframes of chunk_size rows, read as they are needed; their index goes on from one
+    # chunk to the next, as the one of readfile
+    try:
+        return pd.read_csv(resolve(path), chunksize=chunk_size)
+    except:
+        print('file is not found')
+        raise
+
+
+def filter(sen, lexicon):
+    return lexicon.mentioned_in(sen.lower().strip())
+
+
+def prune(sen, lexicon):
+    return lexicon.distinct_groups(sen.lower().strip()) >= 2
 
 
 def cleaning(s):
@@ -35,58 +60,468 @@ def cleaning(s):
     return s.lower().strip()
 
 
-def get_SVOs(df, inoutlabels, savepath):
-    with open('%s/SVOs.json'%savepath, 'w') as out_file:
-        for i, row in df.iterrows():
-            sen = row['sentence'].lower().strip()
+def get_row_ids(df):
+    # the cleaned corpus carries the sentence ids assigned in preprocessing, otherwise fall back to the row index
+    if 'id' in df:
+        return df['id'].tolist()
+    return df.index.tolist()
+
+
+def select_sentences(df, lexicon, lexicons=None, shard=None, no_prune=False, counts=None):
+    # the rows of df (the corpus, or a chunk of it) whose sentences are extracted, cleaned; counts, if given, adds up
+    # the number of sentences mentioning a group ('mentioned') and how many of them were pruned ('pruned')
+    # the masks are boolean even when empty, a chunk may have no row left
+    # keep only the rows of this shard, partitioned by the sentence id
+    if shard is not None:
+        index, count = shard
+        df = df.loc[[shard_of(rid, count) == index for rid in get_row_ids(df)]]
+
+    # apply some minor cleaning on sentences
+    with profiler.stage('cleaning'):
+        df = df.assign(sentence=df.sentence.apply(lambda x: cleaning(x)))
+    # filtering out the sentences which don't contain any of in- or out-group instances
+    with profiler.stage('filter'):
+        df = df[df['sentence'].apply(lambda x: filter(x, lexicon)).astype(bool)]
+    # and, as the subject and object of a triple have to be distinct groups, the ones which can't mention two of them
+    if not no_prune:
+        mentioned = len(df)
+        with profiler.stage('prune'):
+            if lexicons is None:
+                df = df[df['sentence'].apply(lambda x: prune(x, lexicon)).astype(bool)]
+            else:
+                # two groups of the union may come from distinct lexicons
+                df = df[df['sentence'].apply(lambda x: any(prune(x, part) for _, part in lexicons)).astype(bool)]
+        if counts is not None:
+            counts['mentioned'] += mentioned
+            counts['pruned'] += mentioned - len(df)
+    return df
+
+
+def corpus_rows(df):
+    # (id, sentence, pid) of the rows of df, a dataframe or an iterable of dataframes (see readfile_chunks)
+    for chunk in [df] if isinstance(df, pd.DataFrame) else df:
+        pids = chunk['pid'].tolist() if 'pid' in chunk else [None] * len(chunk)
+        yield from zip(get_row_ids(chunk), (sen.lower().strip() for sen in chunk['sentence']), pids)
+
+
+def length_bucket(sen, bounds):
+    # index of the first bucket whose upper bound (in words) fits the sentence; the last bucket is open-ended
+    n = len(sen.split())
+    for b, bound in enumerate(bounds):
+        if n <= bound:
+            return b
+    return len(bounds)
+
+
+def parse_sentences(rows, batch_size=1, length_buckets=(), window_size=10000, n_process=1, skip=None):
+    # rows is an iterable of (row id, sentence); yields (row id, sentence, doc) in the order of rows
+    # the rows for which skip(row id, sentence) is true are not parsed, and come with a None doc
+    nlp = get_nlp()
+    if batch_size <= 1:
+        for rid, sen in rows:
+            if skip is not None and skip(rid, sen):
+                yield rid, sen, None
+            else:
+                yield rid, sen, nlp(sen)
+        return
+
+    # the windows read so far whose rows are not all yielded yet, in order, as [window number, rows, docs, number of
+    # docs to come]
+    pending = deque()
+
+    def texts():
+        # (sentence, (window number, position in the window)) of the rows to parse, window by window: within a
+        # window, the sentences are grouped by length so that short and long sentences don't share batches
+        it = iter(rows)
+        for w in count():
+            window = list(islice(it, window_size))
+            if not window:
+                return
+            buckets = {}
+            for pos, (rid, sen) in enumerate(window):
+                if skip is not None and skip(rid, sen):
+                    continue
+                buckets.setdefault(length_bucket(sen, length_buckets), []).append(pos)
+            pending.append([w, window, [None] * len(window), sum(len(positions) for positions in buckets.values())])
+            for b in sorted(buckets):
+                for pos in buckets[b]:
+                    yield window[pos][1], (w, pos)
+
+    def ready():
+        # the rows of the windows at the front whose docs all came back
+        while pending and pending[0][3] == 0:
+            _, window, docs, _ = pending.popleft()
+            for (rid, sen), doc in zip(window, docs):
+                yield rid, sen, doc
+
+    # a single nlp.pipe over the whole corpus, so its worker processes are started once; the contexts are only
+    # numbers, as they are sent to the workers with the sentences
+    for doc, (w, pos) in nlp.pipe(texts(), batch_size=batch_size, n_process=n_process, as_tuples=True):
+        entry = pending[w - pending[0][0]]
+        entry[2][pos] = doc
+        entry[3] -= 1
+        yield from ready()
+    yield from ready()
+
+
+def extended_SVOs(svos, lexicon, structured=False):
+    # filtering out the SVOs we are interested in -
+    # the ones where subject and object both are an instance of in- or out-group
+    # dropping the ones with auxiliary verb
+    # droppong those where subject and object are the same in- or out-group instance
+    temp = {}
+    for item in svos:
+        if structured:
+            info = item
+            item = (info['subject'], info['verb'], info['object'])
+            not_aux = info['pos'] != 'AUX'
+        else:
+            info = None
+            not_aux = None
+
+        if boolregex(item[0], lexicon) and boolregex(item[2], lexicon):
+            if not_aux is None:
+                not_aux = _is_aux_verb(get_nlp()(item[1]))
+            if not_aux & postproverb(item[1]):
+
+                t = list(item)
+                t[0] = get_inout_grp(item[0], lexicon)
+                t[2] = get_inout_grp(item[2], lexicon)
+                if t[0] != t[2]:
+                    # dropping the redundant triples - keeping the first occurrence so the output doesn't depend on
+                    # the hash seed
+                    temp.setdefault(tuple(t), info)
+
+    if structured:
+        return list(temp), list(temp.values())
+    return list(temp)
+
+
+def filter_triples(svos, lexicon, structured=False):
+    # the extended_SVO (and SVO_info) of a sentence for a lexicon
+    if structured:
+        # SVO_info[k] holds the verb lemma, POS, negation and offsets of extended_SVO[k]
+        extended, info = extended_SVOs(svos, lexicon, structured=True)
+        return {'extended_SVO': extended, 'SVO_info': info}
+    return {'extended_SVO': extended_SVOs(svos, lexicon)}
+
+
+def extract_sentence(tokens, lexicon, structured=False, targeted=False, lexicons=None):
+    # merging the tokens such as non, -, white, as non-white; the docs of the pipeline are merged by its
+    # merge_hyphenated component already (timed there), this only merges the ones built otherwise
+    try:
+        mergesubtokens(tokens)
+    except ValueError:
+        raise
+
+    # extracting the SVO triples - this return even the ones where subject of object are empty
+    # the structured triples carry the POS and lemma of the verb, so the verb doesn't need to be parsed again
+    # targeted, only the ones where both the subject and the object can be a group mention
+    with profiler.stage('findSVOs'):
+        svos = findSVOs(tokens, structured=structured, lexicon=lexicon if targeted else None)
+
+    # lexicons: several lexicons, lexicon being their union; the triples are filtered with each of them, and
+    # result['lexicons'][k] holds those of the k-th one
+    result = {'svos': svos}
+    with profiler.stage('lexicon filtering'):
+        if lexicons is None:
+            result.update(filter_triples(svos, lexicon, structured))
+        else:
+            result['lexicons'] = [filter_triples(svos, part, structured) for part in lexicons]
+    return result
+
+
+def extract_chunk(path, rows, lexicon, structured=False, targeted=False, lexicons=None):
+    # the results of the (id, sentence) rows from their docs in a chunk of stored parses (see parsecache.py), None for
+    # the ones it doesn't hold
+    docs = read_chunk(path, get_nlp().vocab) if path is not None else {}
+    results = []
+    for rid, sen in rows:
+        doc = docs.get(rid)
+        # the sentence is checked too, in case the corpus was cleaned differently since
+        if doc is None or doc.text != sen:
+            results.append(None)
+        else:
+            results.append(extract_sentence(doc, lexicon, structured=structured, targeted=targeted,
+                                            lexicons=lexicons))
+    return results
+
+
+def extract_stored(rows, store, lexicon, batch_size=1, length_buckets=(), window_size=10000, n_process=1,
+                   structured=False, targeted=False, lexicons=None):
+    # same as extract_results, from the docs of a previous run (a ParseStore) instead of parsing the sentences again:
+    # the rows are grouped by the chunk holding their docs, and the chunks are processed on n_process processes
+    # the sentences without a stored doc (e.g. filtered out with the lexicon of that run) are parsed
+    tasks = ((path, list(group)) for path, group in groupby(rows, key=lambda row: store.chunk_of(row[0])))
+    counts = {'stored': 0, 'parsed': 0}
+
+    def chunk_results():
+        # (rows, results) of every chunk, in order, with at most two chunks per process in flight
+        if n_process <= 1:
+            for path, chunk_rows in tasks:
+                yield chunk_rows, extract_chunk(path, chunk_rows, lexicon, structured=structured, targeted=targeted,
+                                                lexicons=lexicons)
+            return
+        with multiprocessing.Pool(n_process, initializer=set_profile, initargs=(get_profile(),)) as pool:
+            pending = deque()
+            for path, chunk_rows in tasks:
+                options = {'structured': structured, 'targeted': targeted, 'lexicons': lexicons}
+                pending.append((chunk_rows, pool.apply_async(extract_chunk, (path, chunk_rows, lexicon), options)))
+                if len(pending) >= 2 * n_process:
+                    chunk_rows, result = pending.popleft()
+                    yield chunk_rows, result.get()
+            while pending:
+                chunk_rows, result = pending.popleft()
+                yield chunk_rows, result.get()
+
+    for chunk_rows, results in profiler.timed('stored parses', chunk_results()):
+        missing = [row for row, result in zip(chunk_rows, results) if result is None]
+        parsed = {}
+        if missing:
+            for rid, _, result in extract_results(missing, lexicon, batch_size=batch_size,
+                                                  length_buckets=length_buckets, window_size=window_size,
+                                                  structured=structured, targeted=targeted, lexicons=lexicons):
+                parsed[rid] = result
+        counts['stored'] += len(chunk_rows) - len(missing)
+        counts['parsed'] += len(missing)
+
+        for (rid, sen), result in zip(chunk_rows, results):
+            yield rid, sen, result if result is not None else parsed[rid]
+
+    print('%d sentences extracted from their stored parses, %d parsed' % (counts['stored'], counts['parsed']))
+
+
+def extract_results(rows, lexicon, batch_size=1, length_buckets=(), window_size=10000, n_process=1,
+                    structured=False, cache=None, targeted=False, save_parses=None, stored=None, lexicons=None):
+    # yields (id, sentence, result of extract_sentence) for the (id, sentence) rows, in order
+    # save_parses: a ParseWriter the docs are written to; stored: a ParseStore the docs are read from instead
+    if stored is not None:
+        yield from extract_stored(rows, stored, lexicon, batch_size=batch_size, length_buckets=length_buckets,
+                                  window_size=window_size, n_process=n_process, structured=structured,
+                                  targeted=targeted, lexicons=lexicons)
+        return
+
+    # the sentences found in the cache are not parsed, their results are kept here until they are yielded
+    hits = {}
+
+    def cached(rid, sen):
+        result = cache.get(sen)
+        if result is not None:
+            hits[rid] = result
+        return result is not None
 
-            triple = {'sentence': sen}
+    parsed = parse_sentences(rows, batch_size, length_buckets, window_size, n_process,
+                             skip=cached if cache else None)
+    for rid, sen, tokens in profiler.timed('parse', parsed):
+        if tokens is None:
+            result = hits.pop(rid)
+        else:
+            with profiler.sample():
+                result = extract_sentence(tokens, lexicon, structured, targeted, lexicons)
+            if save_parses is not None:
+                with profiler.stage('save parses'):
+                    save_parses.add(rid, tokens)
+            if cache is not None:
+                with profiler.stage('cache'):
+                    cache.put(sen, result)
+        yield rid, sen, result
 
-            tokens = nlp(sen)
-            # merging the tokens such as non, -, white, as non-white
-            try:
-                mergesubtokens(tokens)
-            except ValueError:
-                raise
 
-            # extracting the SVO triples - this return even the ones where subject of object are empty
-            svos = findSVOs(tokens)
+def output_dirs(savepath, lexicons=None):
+    # one output per lexicon, in a subdirectory named after it when there are several
+    if lexicons is None:
+        return [savepath]
+    return ['%s/%s' % (savepath, name) for name, _ in lexicons]
 
-            # filtering out the SVOs we are interested in -
-            # the ones where subject and object both are an instance of in- or out-group
-            # dropping the ones with auxiliary verb
-            # droppong those where subject and object are the same in- or out-group instance
-            temp = []
-            for item in svos:
-                if boolregex(item[0], inoutlabels) and boolregex(item[2], inoutlabels):
-                    if _is_aux_verb(nlp(item[1])) & postproverb(item[1]):
 
-                        t = list(item)
-                        t[0] = get_inout_grp(item[0], inoutlabels)
-                        t[2] = get_inout_grp(item[2], inoutlabels)
-                        if t[0] != t[2]:
-                            temp.append(tuple(t))
+def get_SVOs(df, lexicon, savepath, batch_size=1, length_buckets=(), window_size=10000, n_process=1,
+             shard=None, structured=False, resume=False, incremental=False, checkpoint_every=1000, cache=None,
+             targeted=False, compression='', save_parses=None, stored=None, lexicons=None):
+    # compression: '', '.gz' or '.zst', the suffix of the output
+    # lexicons: (name, lexicon) of several lexicons, lexicon being their union; the sentences are parsed once and
+    # their triples written to the output of every lexicon they are found with
+    # df: the corpus, or its chunks as they are read (see readfile_chunks)
+    outpaths = ['%s/%s%s' % (path, svo_filename(shard), compression) for path in output_dirs(savepath, lexicons)]
 
-            # dropping the redundant triples
-            temp = list(set(temp))
-            triple['extended_SVO'] = temp
+    # continue after the last row of the previous run, dropping whatever it wrote after its last checkpoint
+    last_ids, offsets = [None] * len(outpaths), [0] * len(outpaths)
+    if resume or incremental:
+        for k, outpath in enumerate(outpaths):
+            last_ids[k], offsets[k] = recover(outpath, incremental=incremental)
 
-            if triple['extended_SVO']:
-                out_file.write(json.dumps(triple) + '\n')
+    rows = ((rid, sen) for rid, sen, _ in corpus_rows(df))
+    if None not in last_ids:
+        # the sentence ids increase along the corpus, as assigned in preprocessing
+        start = min(last_ids)
+        rows = ((rid, sen) for rid, sen in rows if rid > start)
+
+    with ExitStack() as stack:
+        out_files, writers = [], []
+        for outpath, last_id, offset in zip(outpaths, last_ids, offsets):
+            if lexicons is not None:
+                os.makedirs(os.path.dirname(outpath), exist_ok=True)
+            out_file = stack.enter_context(open(outpath, 'r+b' if last_id is not None else 'wb'))
+            out_file.seek(offset)
+            out_file.truncate()
+            if last_id is None:
+                # the checkpoint of a previous output would otherwise be taken for the one of this run until its
+                # first checkpoint
+                write_checkpoint(checkpoint_path(outpath), out_file, None)
+            out_files.append(out_file)
+            writers.append(FrameWriter(out_file, outpath))
+
+        results = extract_results(rows, lexicon, batch_size=batch_size, length_buckets=length_buckets,
+                                  window_size=window_size, n_process=n_process, structured=structured, cache=cache,
+                                  targeted=targeted, save_parses=save_parses, stored=stored,
+                                  lexicons=None if lexicons is None else [part for _, part in lexicons])
+        for n, (rid, sen, result) in enumerate(results, 1):
+            for k, output in enumerate([result] if lexicons is None else result['lexicons']):
+                # an output resumed further than the others already has the triples of this row
+                if last_ids[k] is not None and rid <= last_ids[k]:
+                    continue
+                triple = {'id': rid, 'sentence': sen, 'extended_SVO': output['extended_SVO']}
+                if structured:
+                    triple['SVO_info'] = output['SVO_info']
+
+                if triple['extended_SVO']:
+                    with profiler.stage('write'):
+                        writers[k].write(dumps_line(triple))
+                last_ids[k] = rid
+
+            if n % checkpoint_every == 0:
+                with profiler.stage('checkpoint'):
+                    for outpath, out_file, writer, last_id in zip(outpaths, out_files, writers, last_ids):
+                        # a compressed output is valid up to the end of its last frame
+                        writer.end_frame()
+                        write_checkpoint(checkpoint_path(outpath), out_file, last_id)
+
+        for outpath, out_file, writer, last_id in zip(outpaths, out_files, writers, last_ids):
+            writer.end_frame()
+            write_checkpoint(checkpoint_path(outpath), out_file, last_id, complete=True)
+
+
+def get_SVOs_parquet(df, lexicon, savepath, batch_size=1, length_buckets=(), window_size=10000, n_process=1,
+                     shard=None, cache=None, targeted=False, row_group_size=100000, save_parses=None, stored=None,
+                     lexicons=None):
+    # same extraction as get_SVOs, written as one row per triple to SVOs.parquet (see columnar.py); the triples are
+    # extracted structured, for the lemma and the negation of their verb
+    outpaths = ['%s/%s' % (path, svo_filename(shard, extension='parquet')) for path in output_dirs(savepath, lexicons)]
+    # the pids of the rows read ahead by the extraction, until their results come back
+    pids = deque()
+
+    def rows():
+        for rid, sen, pid in corpus_rows(df):
+            pids.append(pid)
+            yield rid, sen
+
+    writers = []
+    for outpath in outpaths:
+        if lexicons is not None:
+            os.makedirs(os.path.dirname(outpath), exist_ok=True)
+        writers.append(TripleWriter(outpath, row_group_size=row_group_size))
+    results = extract_results(rows(), lexicon, batch_size=batch_size, length_buckets=length_buckets,
+                              window_size=window_size, n_process=n_process, structured=True, cache=cache,
+                              targeted=targeted, save_parses=save_parses, stored=stored,
+                              lexicons=None if lexicons is None else [part for _, part in lexicons])
+    for rid, _, result in results:
+        pid = pids.popleft()
+        with profiler.stage('write'):
+            for writer, output in zip(writers, [result] if lexicons is None else result['lexicons']):
+                writer.add(rid, pid, output['extended_SVO'], output['SVO_info'])
+    for writer in writers:
+        writer.close()
 
 
 def main(args):
+    set_profile(args.model_profile)
+    set_json_codec(args.json_codec)
+    if args.profile:
+        profiler.enable(sample_every=args.profile_sample)
+
     # read the main file containing sentences and the file which contains the instances of in- and out-groups
-    maindf = readfile(args.data_dir + args.datafile + '.csv')
-    inoutlabels = get_inoutinstances(args.data_dir + args.inoutfile + '.csv').group_name.tolist()
+    # streamed, the main file is read chunk by chunk as the extraction goes
+    with profiler.stage('read'):
+        if args.stream:
+            chunks = readfile_chunks(args.data_dir + args.datafile + '.csv', chunk_size=args.chunk_size)
+        else:
+            maindf = readfile(args.data_dir + args.datafile + '.csv')
+        labelsets = [get_inoutinstances(resolve(args.data_dir + inoutfile + '.csv')).group_name.tolist()
+                     for inoutfile in args.inoutfile]
+    # compile the lexicon once, instead of running one regex per label and phrase
+    # with several lexicon files, the sentences are filtered with the union of their labels, and the triples of each
+    # sentence with every lexicon (see get_SVOs)
+    lexicons = None
+    with profiler.stage('lexicon'):
+        if len(labelsets) == 1:
+            inoutlabels = labelsets[0]
+            lexicon = LexiconMatcher(inoutlabels)
+        else:
+            lexicons = [(inoutfile, LexiconMatcher(labels)) for inoutfile, labels in zip(args.inoutfile, labelsets)]
+            lexicon = LexiconMatcher(list(dict.fromkeys(label for labels in labelsets for label in labels)))
+            # the labels of each file, as the cached results are filtered with each of them
+            inoutlabels = ['%s\t%s' % (inoutfile, label) for inoutfile, labels in zip(args.inoutfile, labelsets)
+                           for label in labels]
 
-    # apply some minor cleaning on sentences
-    maindf.sentence = maindf.sentence.apply(lambda x: cleaning(x))
-    # filtering out the sentences which don't contain any of in- or out-group instances
-    maindf = maindf[maindf['sentence'].apply(lambda x: filter(x, inoutlabels))]
+    # the sentences to extract, cleaned, and filtered with the lexicon
+    counts = {'mentioned': 0, 'pruned': 0}
+    if args.stream:
+        maindf = (select_sentences(chunk, lexicon, lexicons, args.shard, args.no_prune, counts)
+                  for chunk in profiler.timed('read', chunks))
+    else:
+        maindf = select_sentences(maindf, lexicon, lexicons, args.shard, args.no_prune, counts)
+
+    def report_pruned():
+        if not args.no_prune:
+            print('pruned %d of %d sentences mentioning less than two distinct groups' % (counts['pruned'],
+                                                                                          counts['mentioned']))
+    # streamed, the sentences are only counted once they are all read
+    if not args.stream:
+        report_pruned()
+
+    # results of the sentences seen in previous runs, for the same lexicon, model and rules
+    cache = None
+    if args.cache:
+        structured = args.structured or args.output_format == 'parquet'
+        cache = SVOCache(args.cache, fingerprint(inoutlabels, get_nlp(), structured),
+                         max_bytes=args.cache_max_mb * 1024 ** 2)
+
+    # the docs parsed in this run are saved, or the ones of a previous run are read, per model version
+    save_parses, stored = None, None
+    if args.save_parses:
+        save_parses = ParseWriter(parse_dir(args.save_parses, get_nlp()), chunk_size=args.parse_chunk_size)
+    if args.from_parses:
+        stored = ParseStore(parse_dir(args.from_parses, get_nlp()))
+
+    # loading the pipeline is otherwise counted in the time of the first parse
+    if profiler.enabled():
+        with profiler.stage('load model'):
+            get_nlp()
 
     # call the function to extract the SVOs
-    get_SVOs(maindf, inoutlabels, args.save_dir)
+    length_buckets = [int(b) for b in args.length_buckets.split(',')] if args.length_buckets else []
+    if args.output_format == 'parquet':
+        get_SVOs_parquet(maindf, lexicon, args.save_dir, batch_size=args.batch_size,
+                         length_buckets=sorted(length_buckets), window_size=args.bucket_window,
+                         n_process=args.n_process, shard=args.shard, cache=cache, targeted=args.targeted,
+                         row_group_size=args.row_group_size, save_parses=save_parses, stored=stored,
+                         lexicons=lexicons)
+    else:
+        get_SVOs(maindf, lexicon, args.save_dir, batch_size=args.batch_size, length_buckets=sorted(length_buckets),
+                 window_size=args.bucket_window, n_process=args.n_process, shard=args.shard,
+                 structured=args.structured, resume=args.resume, incremental=args.incremental,
+                 checkpoint_every=args.checkpoint_every, cache=cache, targeted=args.targeted,
+                 compression=COMPRESSIONS[args.compress], save_parses=save_parses, stored=stored, lexicons=lexicons)
+
+    if args.stream:
+        report_pruned()
+    if cache is not None:
+        cache.close()
+        print(cache.report())
+    if save_parses is not None:
+        save_parses.close()
+        print('saved the parses of %d sentences to %s' % (save_parses.written, save_parses.directory))
+
+    profiler.write_summary('%s/profile_%s.json' % (args.save_dir, svo_filename(args.shard).replace('.json', '')))
 
 
 if __name__ == '__main__':
@@ -103,14 +538,154 @@ if __name__ == '__main__':
                         help="name of the csv file we aim to extract the SVO triples.")
 
     parser.add_argument("--inoutfile",
-                        default='NSM_ingroups_outgroups',
+                        default=['NSM_ingroups_outgroups'],
+                        nargs='+',
                         type=str,
-                        help="name of the csv file which contains in- and out-group instances.")
+                        help="name of the csv file which contains in- and out-group instances. Several files can be "
+                             "given: the corpus is then parsed once, and the triples of each lexicon are written to "
+                             "a subdirectory of the saving directory named after its file.")
 
     parser.add_argument("--save_dir",
                         default='./save/',
                         type=str,
                         help="path to saving directory.")
 
+    parser.add_argument("--model_profile", "--model-profile",
+                        default=DEFAULT_PROFILE,
+                        choices=list(PROFILES),
+                        help="spaCy model used for parsing; see compare_profiles.py for their speed and quality.")
+
+    parser.add_argument("--stream",
+                        action='store_true',
+                        help="read, clean and filter the csv file chunk by chunk as the sentences are extracted, "
+                             "instead of loading it at once, so the memory doesn't grow with the corpus.")
+
+    parser.add_argument("--chunk_size",
+                        default=10000,
+                        type=int,
+                        help="number of rows of the csv file read at once, with --stream.")
+
+    parser.add_argument("--no_prune",
+                        action='store_true',
+                        help="parse every sentence mentioning a group, even when it can't mention two distinct ones.")
+
+    parser.add_argument("--batch_size",
+                        default=1,
+                        type=int,
+                        help="number of sentences parsed together with nlp.pipe; 1 parses the sentences one by one.")
+
+    parser.add_argument("--length_buckets",
+                        default='8,16,32,64',
+                        type=str,
+                        help="comma separated upper bounds (in words) of the length buckets used for batching.")
+
+    parser.add_argument("--bucket_window",
+                        default=10000,
+                        type=int,
+                        help="number of consecutive sentences that are grouped into length buckets at once.")
+
+    parser.add_argument("--n_process",
+                        default=1,
+                        type=int,
+                        help="number of processes used by nlp.pipe when batching.")
+
+    parser.add_argument("--shard",
+                        default=None,
+                        type=parse_shard,
+                        help="i/N: only process the i-th (0 based) of N slices of the corpus, partitioned by sentence "
+                             "id, and write SVOs_shardiofN.json. Use sharding.py to merge the shards.")
+
+    parser.add_argument("--structured",
+                        action='store_true',
+                        help="keep the lemma, POS, negation and offsets of every triple in SVOs.json (SVO_info), "
+                             "so the verbs are not parsed again here nor in buildnetwork.py.")
+
+    parser.add_argument("--targeted",
+                        action='store_true',
+                        help="only expand the subject/object pairs which can both be group mentions while extracting, "
+                             "instead of filtering all the triples afterwards. SVOs.json is the same.")
+
+    parser.add_argument("--output_format",
+                        default='json',
+                        choices=['json', 'parquet'],
+                        help="json: SVOs.json, a record per sentence; parquet: SVOs.parquet, a row per triple with "
+                             "its sentence id, pid, groups, verb, lemma and negation (needs pyarrow).")
+
+    parser.add_argument("--compress",
+                        default='none',
+                        choices=list(COMPRESSIONS),
+                        help="write SVOs.json.gz or SVOs.json.zst instead of SVOs.json. The input csv files may be "
+                             "compressed (e.g. corpus.csv.gz) whatever this option.")
+
+    parser.add_argument("--json_codec",
+                        default='json',
+                        choices=['json', 'orjson'],
+                        help="encoder of SVOs.json: orjson is faster, gives the same records but not the same bytes.")
+
+    parser.add_argument("--row_group_size",
+                        default=100000,
+                        type=int,
+                        help="number of triples per row group of SVOs.parquet.")
+
+    parser.add_argument("--profile",
+                        action='store_true',
+                        help="record the time, number of calls and memory of every stage of the run, and write them "
+                             "to profile_SVOs.json in the saving directory.")
+
+    parser.add_argument("--profile_sample",
+                        default=0,
+                        type=int,
+                        help="with --profile, also run cProfile on the extraction of every n-th sentence, the "
+                             "statistics are written to profile_SVOs.pstats.")
+
+    parser.add_argument("--checkpoint_every",
+                        default=1000,
+                        type=int,
+                        help="number of sentences between two checkpoints of the output (SVOs.json.ckpt).")
+
+    parser.add_argument("--resume",
+                        action='store_true',
+                        help="continue an interrupted run from its last checkpoint.")
+
+    parser.add_argument("--incremental",
+                        action='store_true',
+                        help="only process the rows with an id above the last one of the previous run, and append "
+                             "their triples to the existing output.")
+
+    parser.add_argument("--cache",
+                        default=None,
+                        type=str,
+                        help="path to a sqlite file caching the results per sentence across runs; no cache if unset.")
+
+    parser.add_argument("--cache_max_mb",
+                        default=1024,
+                        type=int,
+                        help="size of the cache above which the least recently used sentences are evicted.")
+
+    parser.add_argument("--save_parses",
+                        default=None,
+                        type=str,
+                        help="directory the parsed sentences are saved to (as DocBin files, in a subdirectory per "
+                             "model), to run the rules and the lexicon again on them with --from_parses. The "
+                             "sentences found in --cache are not parsed, so not saved.")
+
+    parser.add_argument("--from_parses", "--from-parses",
+                        default=None,
+                        type=str,
+                        help="directory of the parses saved by a previous run with --save_parses: the triples are "
+                             "extracted from them, a chunk per process (see --n_process); only the sentences missing "
+                             "there are parsed.")
+
+    parser.add_argument("--parse_chunk_size",
+                        default=10000,
+                        type=int,
+                        help="number of parsed sentences per file of --save_parses.")
+
     args = parser.parse_args()
+    if len(set(args.inoutfile)) != len(args.inoutfile):
+        parser.error('the same --inoutfile is given twice')
+    if args.from_parses and (args.save_parses or args.cache):
+        parser.error('--from_parses doesn\'t go with --save_parses nor --cache')
+    if args.output_format == 'parquet' and (args.resume or args.incremental):
+        parser.error('--resume and --incremental need --output_format json')
     main(args)
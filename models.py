@@ -0,0 +1,59 @@
+import spacy
+
+# registers the merge_hyphenated and passive_phrases components
+import utils
+
+
+# model profiles, from the fastest to the most accurate one
+PROFILES = {
+    'sm': 'en_core_web_sm',
+    'md': 'en_core_web_md',
+    'lg': 'en_core_web_lg',
+}
+DEFAULT_PROFILE = 'lg'
+
+# components left out of each pipeline configuration, so every caller only runs (and keeps in memory) what it needs
+# svo: tagger, parser, attribute ruler and lemmatizer for extracting the SVO triples
+# lemma: tagger, attribute ruler and lemmatizer for the verb roots of the network
+# the static vectors of md and lg are kept, their tok2vec layers use them as features
+PIPELINES = {
+    'svo': ['ner', 'senter'],
+    'lemma': ['parser', 'ner', 'senter'],
+}
+
+# components of this repo added after the ones of the model, see utils.py
+COMPONENTS = {
+    'svo': ['merge_hyphenated', 'passive_phrases'],
+    'lemma': [],
+}
+
+# the profile used when no model is asked for explicitly
+_profile = DEFAULT_PROFILE
+
+# the pipelines loaded so far in this process, keyed by (model, pipeline)
+_loaded = {}
+
+
+def set_profile(profile):
+    global _profile
+    if profile not in PROFILES:
+        raise ValueError('unknown model profile %s, expected one of %s' % (profile, ', '.join(PROFILES)))
+    _profile = profile
+
+
+def get_profile():
+    return _profile
+
+
+def get_nlp(pipeline='svo', model=None):
+    if model is None:
+        model = PROFILES[_profile]
+
+    # load each configuration lazily, at most once per process
+    key = (model, pipeline)
+    if key not in _loaded:
+        nlp = spacy.load(model, exclude=PIPELINES[pipeline])
+        for name in COMPONENTS[pipeline]:
+            nlp.add_pipe(name)
+        _loaded[key] = nlp
+    return _loaded[key]
@@ -0,0 +1,97 @@
+import bisect
+import hashlib
+import os
+import re
+
+from spacy.tokens import DocBin
+
+# registers the extension attributes of the docs
+import utils
+
+
+# the parsed docs of a run, as DocBin files of up to chunk_size docs named after the first and last sentence id they
+# hold, in a directory per model version. The docs are stored as they come out of the pipeline, i.e. with their
+# hyphenated sub-tokens merged (see utils.py), so the rules of find_SVOs.py and utils.py and the lexicon can be changed
+# and run again on them without parsing the corpus again
+
+CHUNK = re.compile(r'^parses_(\d+)-(\d+)\.spacy$')
+
+
+def model_version(nlp):
+    # the docs depend on the model and the components of its pipeline, not on the lexicon nor the rules
+    pipes = hashlib.sha1(' '.join(nlp.pipe_names).encode('utf-8')).hexdigest()[:8]
+    return '%s_%s-%s-%s' % (nlp.meta.get('lang'), nlp.meta.get('name'), nlp.meta.get('version'), pipes)
+
+
+def parse_dir(directory, nlp):
+    return os.path.join(directory, model_version(nlp))
+
+
+class ParseWriter:
+    def __init__(self, directory, chunk_size=10000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.written = 0
+        self._new_chunk()
+
+    def _new_chunk(self):
+        # the extension attributes of the docs (passive spans, ...) are kept with their user data
+        self.docbin = DocBin(store_user_data=True)
+        self.ids = []
+
+    def add(self, rid, doc):
+        # the docs are added in the order of their sentence ids, as the corpus is processed
+        doc.user_data['id'] = rid
+        self.docbin.add(doc)
+        self.ids.append(rid)
+        if len(self.ids) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.ids:
+            return
+        # written aside and renamed, so an interrupted run never leaves a partial chunk behind
+        path = os.path.join(self.directory, 'parses_%d-%d.spacy' % (self.ids[0], self.ids[-1]))
+        self.docbin.to_disk(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self.written += len(self.ids)
+        self._new_chunk()
+
+    def close(self):
+        self.flush()
+
+
+def read_chunk(path, vocab):
+    # sentence id -> doc of a chunk
+    docbin = DocBin(store_user_data=True).from_disk(path)
+    docs = {}
+    for doc in docbin.get_docs(vocab):
+        # only the merged sub-tokens are kept, the passive spans are found again with the current rules by findSVOs
+        doc._.passive_spans = None
+        doc._.in_passive = None
+        docs[doc.user_data['id']] = doc
+    return docs
+
+
+# the chunks written in a directory by ParseWriter, located by sentence id
+class ParseStore:
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError('no parses in %s, write them first with --save_parses' % directory)
+        self.directory = directory
+        self.chunks = []
+        for name in os.listdir(directory):
+            match = CHUNK.match(name)
+            if match:
+                self.chunks.append((int(match.group(1)), int(match.group(2)), os.path.join(directory, name)))
+        self.chunks.sort()
+        self.firsts = [chunk[0] for chunk in self.chunks]
+
+    def chunk_of(self, rid):
+        # path of the chunk whose id range holds rid, None if there is none; the chunk still lacks the sentences
+        # which were not parsed (filtered out, or found in the cache, when it was written)
+        index = bisect.bisect_right(self.firsts, rid) - 1
+        if index >= 0 and rid <= self.chunks[index][1]:
+            return self.chunks[index][2]
+        return None
@@ -5,6 +5,15 @@ import re
 import numpy as np
 import csv
 import argparse
+import multiprocessing
+import hashlib
+import math
+import sys
+from collections import deque
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import profiler
+from fileio import COMPRESSIONS, open_file, resolve
 
 
 def split_dataframe(df, chunk_size):
@@ -13,96 +22,231 @@ def split_dataframe(df, chunk_size):
         yield df[i * chunk_size:(i + 1) * chunk_size].copy(deep=True)
 
 
-def preprocess(df, path, filename, chunk_size=5000, verbose=True):
-    if os.path.exists(path + '/%s_cleaned.csv'%(filename)):
-        df = pd.read_csv(path + '/%s_cleaned.csv'%(filename))
+def clean(s):
+    WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
+    s.replace('\n', ' ')
+    s.replace('\t', ' ')
+    s = re.sub(WHITESPACEREGEX, ' ', s)
+    return s.strip()
+
+
+def filterpunc(x):
+    NONPUNCREGEX = r'[a-zA-Z0-9]'
+    WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
+    if re.search(NONPUNCREGEX, x) is None:
+        return ''
+    x = re.sub(WHITESPACEREGEX, ' ', x)
+    return x.strip()
+
+
+def filternonalpha(x):
+    NONPUNCREGEX = r'[a-zA-Z]'
+    WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
+    if re.search(NONPUNCREGEX, x) is None:
+        return ''
+    x = re.sub(WHITESPACEREGEX, ' ', x)
+    return x.strip()
+
+
+def exclean(s):
+    parantez = r'(\}|\{|\]|\[|\)|\()'
+    symbols = r'(#|&)'
+    DOTSREGEX = r'(\. |\.){2,}'
+    DASHREGEX = r'(-( )?|_( )?){2,}'
+    WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
+    s = re.sub(parantez, ' ', s)
+    s = re.sub(symbols, ' ', s)
+    s = re.sub(DOTSREGEX, '.', s)
+    s = re.sub(DASHREGEX, '-', s)
+    s = re.sub(WHITESPACEREGEX, ' ', s)
+    return s.strip()
+
+
+# there should be a subject, verb, and object, so drop the sentences with less than 3 words
+def dropshortsen(df, min=3, verbose=True):
+    def num_wrd(sen):
+        return len(sen.split())
+
+    df.loc[:, 'wrdC'] = df.sentence.apply(lambda x: num_wrd(x))
+    temp = df.loc[df['wrdC'] >= min].copy()
+
+    temp.drop_duplicates(subset=['sentence'], keep='first', inplace=True)
+    if verbose:
+        print(df.shape, temp.shape)
+    return temp
+
+
+# blank english pipeline with a sentencizer, built once per process
+_sentencizer = None
+
+
+def get_sentencizer():
+    global _sentencizer
+    if _sentencizer is None:
+        _sentencizer = spacy.blank('en')
+        _sentencizer.add_pipe('sentencizer')
+    return _sentencizer
+
+
+def split_chunk(subdf, verbose=False):
+    # split the paragraphs of a chunk into cleaned sentences, returns a dataframe of (pid, sentence)
+    nlp = get_sentencizer()
+
+    # now split the paragraph to its the sentences
+    pids = []
+    sentences = []
+    texts = [clean(x) for x in subdf['sentence']]
+    for pid, doc in zip(subdf['name_id'], nlp.pipe(texts, batch_size=256)):
+        for sent in doc.sents:
+            pids.append(pid)
+            sentences.append(sent.text)
+    splited = pd.DataFrame({'pid': pids, 'sentence': sentences})
+
+    # detect rows which only contains punctuations, or only numbers
+    splited['sentence'] = splited['sentence'].apply(lambda x: filterpunc(x))
+    splited['sentence'] = splited['sentence'].apply(lambda x: filternonalpha(x))
+    # drop empty rows
+    splited['sentence'] = splited['sentence'].replace('', np.nan)
+    splited.dropna(subset=['sentence'], inplace=True)
+    splited.reset_index(drop=True, inplace=True)
+
+    # removing several dots, or dashes, ...
+    splited['sentence'] = splited['sentence'].apply(lambda x: exclean(x))
+    splited = dropshortsen(splited, verbose=verbose)
+    return splited[['pid', 'sentence']]
+
+
+# 64 bits fingerprint of a sentence, far more compact to keep around than the sentence itself
+def sentence_fingerprint(sen):
+    return int.from_bytes(hashlib.blake2b(sen.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# exact set of the sentences seen so far, by fingerprint
+class FingerprintSet:
+    def __init__(self):
+        self.fingerprints = set()
+
+    def add(self, sen):
+        # returns True the first time a sentence is seen
+        fp = sentence_fingerprint(sen)
+        if fp in self.fingerprints:
+            return False
+        self.fingerprints.add(fp)
+        return True
+
+
+# bloom filter of the sentences seen so far, for corpora whose fingerprints don't fit in memory
+# a sentence is wrongly taken for a duplicate with probability error_rate once capacity sentences are added
+# its bits are allocated up front: about 1.8 bytes per sentence of capacity at error_rate 0.001, i.e. 18 MB for the
+# default capacity
+BLOOM_CAPACITY = 10000000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, sen):
+        # returns True the first time a sentence is seen (up to the false positives)
+        digest = hashlib.blake2b(sen.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little')
+        new = False
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                self.bits[position >> 3] |= 1 << (position & 7)
+                new = True
+        return new
+
+
+def get_dedup(dedup, bloom_capacity=BLOOM_CAPACITY, bloom_error=0.001):
+    if dedup == 'exact':
+        return FingerprintSet()
+    if dedup == 'bloom':
+        return BloomFilter(bloom_capacity, bloom_error)
+    return None
+
+
+def _ordered_map(func, items, n_process, verbose):
+    # map func over the items with a process pool, in order, with at most two chunks per process in flight so the
+    # input is never read much further ahead than it is processed
+    if n_process <= 1:
+        for item in items:
+            yield func(item, verbose)
+        return
+
+    with multiprocessing.Pool(n_process) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item, verbose)))
+            if len(pending) >= 2 * n_process:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def write_sentences(chunks, outpath, n_process=1, dedup=None, verbose=True):
+    # the ids are given in the order of the chunks, so they don't depend on the number of processes
+    # dedup (see get_dedup) drops the sentences already seen in previous chunks; within a chunk they are dropped by
+    # dropshortsen
+    duplicates = 0
+    # written aside and renamed once complete, so an interrupted run doesn't leave an output taken for a finished one
+    tmppath = os.path.join(os.path.dirname(outpath), 'tmp_' + os.path.basename(outpath))
+    with open_file(tmppath, mode='w') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['id', 'pid', 'sentence'])
+
+        id = 1
+        for splited in profiler.timed('split', _ordered_map(split_chunk, chunks, n_process, verbose)):
+            if dedup is not None:
+                with profiler.stage('dedup'):
+                    keep = [dedup.add(sen) for sen in splited['sentence']]
+                    duplicates += len(keep) - sum(keep)
+                    # a boolean mask, so a chunk without sentences keeps its columns
+                    splited = splited[pd.Series(keep, index=splited.index, dtype=bool)]
+
+            with profiler.stage('write'):
+                writer.writerows(zip(range(id, id + len(splited)), splited['pid'], splited['sentence']))
+            id += len(splited)
+    os.replace(tmppath, outpath)
+
+    if verbose and dedup is not None:
+        print('removed %d duplicate sentences across chunks' % duplicates)
+    return duplicates
+
+
+def preprocess(df, path, filename, chunk_size=5000, dedup='exact', bloom_capacity=BLOOM_CAPACITY, verbose=True,
+               compression=''):
+    # compression: '', '.gz' or '.zst', the suffix of the output; an existing output is found whatever its suffix
+    if os.path.exists(resolve(path + '/%s_cleaned.csv'%(filename))):
+        df = pd.read_csv(resolve(path + '/%s_cleaned.csv'%(filename)))
         if verbose:
             print(df.shape, list(df), len(df.pid.unique()))
         return df
 
-    def clean(s):
-        WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
-        s.replace('\n', ' ')
-        s.replace('\t', ' ')
-        s = re.sub(WHITESPACEREGEX, ' ', s)
-        return s.strip()
-
-    def filterpunc(x):
-        NONPUNCREGEX = r'[a-zA-Z0-9]'
-        WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
-        if re.search(NONPUNCREGEX, x) is None:
-            return ''
-        x = re.sub(WHITESPACEREGEX, ' ', x)
-        return x.strip()
-
-    def filternonalpha(x):
-        NONPUNCREGEX = r'[a-zA-Z]'
-        WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
-        if re.search(NONPUNCREGEX, x) is None:
-            return ''
-        x = re.sub(WHITESPACEREGEX, ' ', x)
-        return x.strip()
-
-    def exclean(s):
-        parantez = r'(\}|\{|\]|\[|\)|\()'
-        symbols = r'(#|&)'
-        DOTSREGEX = r'(\. |\.){2,}'
-        DASHREGEX = r'(-( )?|_( )?){2,}'
-        WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
-        s = re.sub(parantez, ' ', s)
-        s = re.sub(symbols, ' ', s)
-        s = re.sub(DOTSREGEX, '.', s)
-        s = re.sub(DASHREGEX, '-', s)
-        s = re.sub(WHITESPACEREGEX, ' ', s)
-        return s.strip()
-
-    # there should be a subject, verb, and object, so drop the sentences with less than 3 words
-    def dropshortsen(df, min=3):
-        def num_wrd(sen):
-            return len(sen.split())
-
-        df.loc[:, 'wrdC'] = df.sentence.apply(lambda x: num_wrd(x))
-        temp = df.loc[df['wrdC'] >= min].copy()
-
-        temp.drop_duplicates(subset=['sentence'], keep='first', inplace=True)
-        if verbose:
-            print(df.shape, temp.shape)
-        return temp
-
     df = df[['name_id', 'sentence']].copy()
+    write_sentences(split_dataframe(df, chunk_size=chunk_size), path + filename + '_cleaned.csv' + compression,
+                    dedup=get_dedup(dedup, bloom_capacity), verbose=verbose)
 
-    with open(path + filename + '_cleaned.csv', mode='w') as csv_file:
-        fieldnames = ['id', 'pid', 'sentence']
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
 
-        id = 1
-        for subdf in split_dataframe(df, chunk_size=chunk_size):
-            subdf['sentence'] = subdf.sentence.apply(lambda x: clean(x))
-
-            # now split the paragraph to its the sentences i
-            nlp = spacy.blank('en')
-            nlp.add_pipe('sentencizer')
-            def splitsen(x):
-                return [sent.text for sent in nlp(x).sents]
-            splited = pd.concat([pd.Series(row['name_id'], splitsen(row['sentence'])) for _, row in subdf.iterrows()]).reset_index()
-            splited.rename(columns={'index': 'sentence', 0: 'pid'}, inplace=True)
-
-            # detect rows which only contains punctuations, or only numbers
-            splited['sentence'] = splited['sentence'].apply(lambda x: filterpunc(x))
-            splited['sentence'] = splited['sentence'].apply(lambda x: filternonalpha(x))
-            # drop empty rows
-            splited['sentence'].replace('', np.nan, inplace=True)
-            splited.dropna(subset=['sentence'], inplace=True)
-            splited.reset_index(inplace=True)
-
-            # removing several dots, or dashes, ...
-            splited['sentence'] = splited['sentence'].apply(lambda x: exclean(x))
-            splited = dropshortsen(splited)
-
-            for i, row in splited.iterrows():
-                writer.writerow({'id': id, 'pid': row['pid'], 'sentence': row['sentence']})
-                id += 1
+def preprocess_stream(pathtofile, path, filename, chunk_size=5000, n_process=1, dedup='exact',
+                      bloom_capacity=BLOOM_CAPACITY, verbose=True, compression=''):
+    # same as preprocess, reading the raw csv chunk by chunk so it never has to fit in memory, and splitting the
+    # chunks into sentences on n_process processes
+    if os.path.exists(resolve(path + '/%s_cleaned.csv'%(filename))):
+        if verbose:
+            print('%s_cleaned.csv already exists' % filename)
+        return
+
+    # read as they are split, the time of split includes the one of read
+    # a compressed csv is decompressed as it is read
+    chunks = profiler.timed('read', pd.read_csv(resolve(pathtofile), usecols=['name_id', 'sentence'],
+                                                chunksize=chunk_size))
+    write_sentences(chunks, path + filename + '_cleaned.csv' + compression, n_process=n_process,
+                    dedup=get_dedup(dedup, bloom_capacity), verbose=verbose)
 
 
 def main():
@@ -118,11 +262,59 @@ def main():
                         type=str,
                         help="name of the csv file we aim to extract the SVO triples.")
 
+    parser.add_argument("--stream",
+                        action='store_true',
+                        help="read the csv file in chunks instead of loading it at once.")
+
+    parser.add_argument("--chunk_size",
+                        default=5000,
+                        type=int,
+                        help="number of paragraphs processed at once.")
+
+    parser.add_argument("--n_process",
+                        default=1,
+                        type=int,
+                        help="number of processes splitting the chunks into sentences, with --stream.")
+
+    parser.add_argument("--dedup",
+                        default='exact',
+                        choices=['exact', 'bloom', 'none'],
+                        help="drop the sentences seen earlier in the corpus, with a set of their fingerprints or a "
+                             "bloom filter; 'none' only drops them within a chunk.")
+
+    parser.add_argument("--bloom_capacity",
+                        default=BLOOM_CAPACITY,
+                        type=int,
+                        help="expected number of sentences for --dedup bloom. The filter takes about 1.8 bytes per "
+                             "sentence of capacity, allocated up front (18 MB for the default).")
+
+    parser.add_argument("--compress",
+                        default='none',
+                        choices=list(COMPRESSIONS),
+                        help="write the cleaned csv file compressed (_cleaned.csv.gz or .zst). The raw csv file may "
+                             "be compressed whatever this option.")
+
+    parser.add_argument("--profile",
+                        action='store_true',
+                        help="record the time, number of calls and memory of every stage, and write them to "
+                             "profile_preprocessing.json in the data dir.")
+
     args = parser.parse_args()
+    if args.profile:
+        profiler.enable()
+
+    if args.stream:
+        preprocess_stream(args.data_dir + args.datafile + '.csv', args.data_dir, args.datafile,
+                          chunk_size=args.chunk_size, n_process=args.n_process, dedup=args.dedup,
+                          bloom_capacity=args.bloom_capacity, compression=COMPRESSIONS[args.compress])
+    else:
+        with profiler.stage('read'):
+            df = pd.read_csv(resolve(args.data_dir+args.datafile+'.csv'))
+        preprocess(df, args.data_dir, args.datafile, chunk_size=args.chunk_size, dedup=args.dedup,
+                   bloom_capacity=args.bloom_capacity, compression=COMPRESSIONS[args.compress])
 
-    df = pd.read_csv(args.data_dir+args.datafile+'.csv')
-    preprocess(df, args.data_dir, args.datafile)
+    profiler.write_summary(args.data_dir + 'profile_preprocessing.json')
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,135 @@
+import cProfile
+import json
+import os
+import resource
+import time
+
+
+# wall time, number of calls and memory per stage of a run, recorded once enable() is called. Until then stage(),
+# timed() and sample() hand back shared no-op objects (or the iterable itself), so the instrumented code pays one
+# function call per stage at most.
+# the memory is the peak resident set size of the process: for every stage, the peak at the end of its last call and
+# how much its calls raised it. Stages may nest (e.g. parse includes the cache lookups), their times then overlap
+_enabled = False
+_started = None
+_stages = {}
+_profile = None
+_sample_every = 0
+_calls = 0
+
+
+def _maxrss_mb():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def enable(sample_every=0):
+    # sample_every > 0: also run cProfile on every sample_every-th call of sample()
+    global _enabled, _started, _profile, _sample_every
+    _enabled = True
+    _started = time.perf_counter()
+    if sample_every > 0:
+        _profile = cProfile.Profile()
+        _sample_every = sample_every
+
+
+def enabled():
+    return _enabled
+
+
+def _record(name, seconds, before, after):
+    if name not in _stages:
+        _stages[name] = {'calls': 0, 'seconds': 0.0, 'rss_growth_mb': 0.0, 'peak_rss_mb': 0.0}
+    record = _stages[name]
+    record['calls'] += 1
+    record['seconds'] += seconds
+    record['rss_growth_mb'] += after - before
+    record['peak_rss_mb'] = after
+
+
+class _Stage:
+    __slots__ = ('name', 'start', 'rss')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.rss = _maxrss_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.start, self.rss, _maxrss_mb())
+        return False
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name):
+    # with stage('findSVOs'): ...
+    if not _enabled:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+def timed(name, iterable):
+    # the time spent producing the items of iterable (e.g. the generator parsing the sentences), a call per item
+    if not _enabled:
+        return iterable
+    return _timed(name, iterable)
+
+
+def _timed(name, iterable):
+    iterator = iter(iterable)
+    while True:
+        rss = _maxrss_mb()
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        _record(name, time.perf_counter() - start, rss, _maxrss_mb())
+        yield item
+
+
+def sample():
+    # with sample(): ... is run under cProfile once every sample_every calls
+    global _calls
+    if _profile is None:
+        return _NO_STAGE
+    _calls += 1
+    if _calls % _sample_every:
+        return _NO_STAGE
+    return _profile
+
+
+def write_summary(path):
+    # the stages as json, the cProfile statistics (if any) next to it as .pstats, and a table of the slowest stages
+    if not _enabled:
+        return
+
+    summary = {'wall_sec': time.perf_counter() - _started,
+               'peak_rss_mb': _maxrss_mb(),
+               'stages': _stages}
+    if _profile is not None:
+        summary['sampled_calls'] = _calls // _sample_every
+        summary['pstats'] = os.path.splitext(path)[0] + '.pstats'
+        _profile.dump_stats(summary['pstats'])
+
+    with open(path, 'w') as out_file:
+        json.dump(summary, out_file, indent=2)
+
+    print('%-20s %10s %12s %16s' % ('stage', 'calls', 'seconds', 'rss growth (MB)'))
+    for name, record in sorted(_stages.items(), key=lambda x: -x[1]['seconds']):
+        print('%-20s %10d %12.3f %16.1f' % (name, record['calls'], record['seconds'], record['rss_growth_mb']))
+    print('total %.3f seconds, peak memory %.0f MB, summary written to %s' % (summary['wall_sec'],
+                                                                          summary['peak_rss_mb'], path))
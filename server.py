@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fileio import resolve
+from lexicon import LexiconMatcher
+from main import cleaning, filter, prune, parse_sentences, extract_sentence
+from models import PROFILES, DEFAULT_PROFILE, get_nlp, set_profile
+from utils import get_inoutinstances
+
+
+# number of request latencies the percentiles are computed over
+LATENCY_WINDOW = 10000
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(round(q * (len(values) - 1)))]
+
+
+# keeps the pipeline and the lexicon loaded, and extracts the SVOs of the sentences of concurrent requests together:
+# a batch is sent to nlp.pipe once it has batch_size sentences, or max_wait seconds after its first sentence came in.
+# The parsing runs in a worker thread, so the next batch fills up in the meantime
+class SVOService:
+    def __init__(self, lexicon, batch_size=64, max_wait=0.02, structured=False, targeted=False, no_prune=False):
+        self.lexicon = lexicon
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.structured = structured
+        self.targeted = targeted
+        self.no_prune = no_prune
+
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.counts = {'requests': 0, 'sentences': 0, 'batches': 0, 'max_queue_depth': 0}
+
+    def start(self):
+        # the model is loaded before the first request, not on it
+        get_nlp()
+        self.queue = asyncio.Queue()
+        return asyncio.ensure_future(self._batcher())
+
+    def _candidate(self, rid, sen):
+        # the sentences main.py filters out have no triple, they are not parsed
+        return filter(sen, self.lexicon) and (self.no_prune or prune(sen, self.lexicon))
+
+    def _process(self, sentences):
+        # run in the worker thread: the result of every sentence, in order
+        rows = list(enumerate(sentences))
+        results = []
+        for _, sen, tokens in parse_sentences(rows, batch_size=self.batch_size,
+                                              skip=lambda rid, sen: not self._candidate(rid, sen)):
+            if tokens is None:
+                results.append({'extended_SVO': [], 'SVO_info': []} if self.structured else {'extended_SVO': []})
+            else:
+                results.append(extract_sentence(tokens, self.lexicon, self.structured, self.targeted))
+        return results
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    # late already (e.g. queued during the previous batch), take what is waiting
+                    while len(batch) < self.batch_size and not self.queue.empty():
+                        batch.append(self.queue.get_nowait())
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await loop.run_in_executor(self.executor, self._process, [item[0] for item in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.counts['batches'] += 1
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def extract(self, rows):
+        # rows: (id, sentence); returns the records get_SVOs writes, for every sentence, even without triple
+        loop = asyncio.get_running_loop()
+        sentences = [cleaning(sen).lower().strip() for _, sen in rows]
+        futures = []
+        for sen in sentences:
+            future = loop.create_future()
+            self.queue.put_nowait((sen, future, loop.time()))
+            futures.append(future)
+        self.counts['max_queue_depth'] = max(self.counts['max_queue_depth'], self.queue.qsize())
+
+        records = []
+        for (rid, _), sen, result in zip(rows, sentences, await asyncio.gather(*futures)):
+            record = {'id': rid, 'sentence': sen, 'extended_SVO': result['extended_SVO']}
+            if self.structured:
+                record['SVO_info'] = result['SVO_info']
+            records.append(record)
+
+        self.counts['requests'] += 1
+        self.counts['sentences'] += len(rows)
+        return records
+
+    def stats(self):
+        latencies = list(self.latencies)
+        stats = dict(self.counts)
+        stats['queue_depth'] = self.queue.qsize() if self.queue is not None else 0
+        stats['mean_batch_size'] = self.counts['sentences'] / self.counts['batches'] if self.counts['batches'] else 0
+        stats['p50_ms'] = percentile(latencies, 0.5)
+        stats['p99_ms'] = percentile(latencies, 0.99)
+        return stats
+
+
+def parse_rows(body):
+    # {"sentences": ["...", ...]} or {"sentences": [{"id": ..., "sentence": "..."}, ...]}
+    sentences = json.loads(body)['sentences']
+    rows = []
+    for index, item in enumerate(sentences):
+        if isinstance(item, dict):
+            rows.append((item.get('id', index), item['sentence']))
+        else:
+            rows.append((index, item))
+    for _, sen in rows:
+        if not isinstance(sen, str):
+            raise ValueError('the sentences should be strings')
+    return rows
+
+
+async def route(service, method, path, body):
+    # (status, payload)
+    if method == 'POST' and path == '/extract':
+        try:
+            rows = parse_rows(body)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': 'expected {"sentences": [...]}: %s' % e}
+        return 200, {'results': await service.extract(rows)}
+    if method == 'GET' and path == '/stats':
+        return 200, service.stats()
+    return 404, {'error': 'unknown endpoint %s %s, expected POST /extract or GET /stats' % (method, path)}
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+
+def make_handler(service):
+    # one request per connection, HTTP/1.1 with Connection: close
+    async def handle(reader, writer):
+        start = time.perf_counter()
+        path = ''
+        try:
+            method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            status, payload = await route(service, method, path.split('?')[0], body)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, payload = 400, {'error': 'malformed request: %s' % e}
+        except Exception as e:
+            status, payload = 500, {'error': str(e)}
+
+        data = json.dumps(payload).encode('utf-8')
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                      'Connection: close\r\n\r\n' % (status, REASONS[status], len(data))).encode('latin-1') + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+        if status == 200 and path.startswith('/extract'):
+            service.latencies.append((time.perf_counter() - start) * 1000)
+    return handle
+
+
+async def report(service, every):
+    while True:
+        await asyncio.sleep(every)
+        stats = service.stats()
+        print('%d requests, %d sentences in %d batches, p50 %s ms, p99 %s ms, queue depth %d (max %d)' % (
+            stats['requests'], stats['sentences'], stats['batches'],
+            '%.1f' % stats['p50_ms'] if stats['p50_ms'] is not None else '-',
+            '%.1f' % stats['p99_ms'] if stats['p99_ms'] is not None else '-',
+            stats['queue_depth'], stats['max_queue_depth']), flush=True)
+
+
+async def serve(service, host='127.0.0.1', port=8080, socket_path=None, report_every=0):
+    service.start()
+    handler = make_handler(service)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(handler, path=socket_path)
+        print('serving on unix socket %s' % socket_path, flush=True)
+    else:
+        server = await asyncio.start_server(handler, host=host, port=port)
+        print('serving on http://%s:%d' % (host, port), flush=True)
+
+    if report_every > 0:
+        asyncio.ensure_future(report(service, report_every))
+    async with server:
+        await server.serve_forever()
+
+
+def main(args):
+    set_profile(args.model_profile)
+    inoutlabels = get_inoutinstances(resolve(args.data_dir + args.inoutfile + '.csv')).group_name.tolist()
+    service = SVOService(LexiconMatcher(inoutlabels), batch_size=args.batch_size, max_wait=args.max_wait_ms / 1000,
+                         structured=args.structured, targeted=args.targeted, no_prune=args.no_prune)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.socket, args.report_every))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--data_dir",
+                        default='./data/',
+                        type=str,
+                        help="The input data dir. Should contain the in- and out-group csv file.")
+
+    parser.add_argument("--inoutfile",
+                        default='NSM_ingroups_outgroups',
+                        type=str,
+                        help="name of the csv file which contains in- and out-group instances.")
+
+    parser.add_argument("--model_profile", "--model-profile",
+                        default=DEFAULT_PROFILE,
+                        choices=list(PROFILES),
+                        help="spaCy model used to parse the sentences.")
+
+    parser.add_argument("--host",
+                        default='127.0.0.1',
+                        type=str,
+                        help="address to listen on.")
+
+    parser.add_argument("--port",
+                        default=8080,
+                        type=int,
+                        help="port to listen on.")
+
+    parser.add_argument("--socket",
+                        default=None,
+                        type=str,
+                        help="path of a unix socket to listen on instead of host and port.")
+
+    parser.add_argument("--batch_size",
+                        default=64,
+                        type=int,
+                        help="maximum number of sentences parsed together with nlp.pipe.")
+
+    parser.add_argument("--max_wait_ms",
+                        default=20,
+                        type=float,
+                        help="longest time a sentence waits for others to fill its batch.")
+
+    parser.add_argument("--structured",
+                        action='store_true',
+                        help="also return the lemma, POS, negation and offsets of every triple (SVO_info).")
+
+    parser.add_argument("--targeted",
+                        action='store_true',
+                        help="only expand the subject/object pairs which can both be group mentions.")
+
+    parser.add_argument("--no_prune",
+                        action='store_true',
+                        help="also parse the sentences which can't mention two distinct groups.")
+
+    parser.add_argument("--report_every",
+                        default=60,
+                        type=float,
+                        help="seconds between two prints of the latency percentiles and queue depth, 0 to disable.")
+
+    args = parser.parse_args()
+    main(args)
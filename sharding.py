@@ -0,0 +1,70 @@
+import argparse
+import hashlib
+import heapq
+import os
+
+from fileio import compression_of, loads, open_file, resolve
+
+
+def parse_shard(shard):
+    # '--shard i/N' selects the i-th (0 based) of N slices of the corpus
+    try:
+        index, count = [int(x) for x in shard.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('shard should be given as i/N, e.g. 0/4')
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError('shard index should be in [0, N)')
+    return index, count
+
+
+def shard_of(rid, count):
+    # stable across processes and machines, unlike the builtin hash() of strings
+    return int(hashlib.md5(str(rid).encode('utf-8')).hexdigest(), 16) % count
+
+
+def svo_filename(shard=None, extension='json'):
+    if shard is None:
+        return 'SVOs.%s' % extension
+    return 'SVOs_shard%dof%d.%s' % (shard + (extension,))
+
+
+def read_shard(path):
+    # yields (sentence id, line) so the shards can be merged without re-encoding the records
+    with open_file(path, 'rb') as in_file:
+        for line in in_file:
+            yield loads(line)['id'], line
+
+
+def merge_shards(json_dir, count):
+    # the shards may be compressed (.gz, .zst), the merged output is compressed as the first one
+    paths = [resolve(os.path.join(json_dir, svo_filename((index, count)))) for index in range(count)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError('missing shard outputs: %s' % ', '.join(missing))
+
+    # every shard is written in the order of the corpus, which is the order of the sentence ids assigned in
+    # preprocessing, so a k-way merge on the id gives back the output of a single-process run
+    with open_file(os.path.join(json_dir, svo_filename()) + compression_of(paths[0]), 'wb') as out_file:
+        for _, line in heapq.merge(*[read_shard(path) for path in paths], key=lambda x: x[0]):
+            out_file.write(line)
+
+
+def main(args):
+    merge_shards(args.json_dir, args.shards)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--json_dir",
+                        default='./save/',
+                        type=str,
+                        help="path to the directory containing the SVOs_shardiofN.json files.")
+
+    parser.add_argument("--shards",
+                        required=True,
+                        type=int,
+                        help="number of shards N the corpus was split into.")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import find_SVOs
+import lexicon
+import utils
+
+
+# number of writes between two commits (and size checks) of the cache
+COMMIT_EVERY = 1000
+
+
+def rules_version():
+    # hash of the extraction rules, so editing them invalidates the cached results
+    digest = hashlib.sha1()
+    for module in (find_SVOs, utils, lexicon):
+        with open(module.__file__, 'rb') as in_file:
+            digest.update(in_file.read())
+    return digest.hexdigest()
+
+
+def fingerprint(inoutlabels, nlp, structured=False):
+    # everything besides the sentence the cached results depend on: the lexicon, the model and the rules
+    digest = hashlib.sha1()
+    digest.update('\n'.join(inoutlabels).encode('utf-8'))
+    digest.update(('%s_%s-%s' % (nlp.meta.get('lang'), nlp.meta.get('name'), nlp.meta.get('version'))).encode('utf-8'))
+    digest.update(' '.join(nlp.pipe_names).encode('utf-8'))
+    digest.update(rules_version().encode('utf-8'))
+    digest.update(b'structured' if structured else b'plain')
+    return digest.hexdigest()
+
+
+# on-disk cache of the per-sentence results, keyed by the cleaned sentence and the fingerprint of the run
+# the least recently used entries are evicted once the cache grows over max_bytes
+class SVOCache:
+    def __init__(self, path, fingerprint, max_bytes=1024 ** 3):
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS svos '
+                        '(key BLOB PRIMARY KEY, value TEXT, size INTEGER, used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS svos_used ON svos (used)')
+        self.size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM svos').fetchone()[0]
+
+    def key(self, sen):
+        return hashlib.sha1(('%s\n%s' % (self.fingerprint, sen)).encode('utf-8')).digest()
+
+    def get(self, sen):
+        key = self.key(sen)
+        row = self.db.execute('SELECT value FROM svos WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.db.execute('UPDATE svos SET used = ? WHERE key = ?', (time.time(), key))
+        self._written()
+        return json.loads(row[0])
+
+    def put(self, sen, result):
+        # only the filtered triples are kept: the unfiltered ones (svos) are not used once extracted, and depend on
+        # --targeted, which the fingerprint leaves out
+        value = json.dumps({key: item for key, item in result.items() if key != 'svos'})
+        cursor = self.db.execute('INSERT OR IGNORE INTO svos VALUES (?, ?, ?, ?)',
+                                 (self.key(sen), value, len(value), time.time()))
+        self.size += len(value) * cursor.rowcount
+        self._written()
+
+    def _written(self):
+        self._writes += 1
+        if self._writes % COMMIT_EVERY == 0:
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        # once over the maximum size, drop the least recently used entries until the cache is back to 90% of it
+        if self.size <= self.max_bytes:
+            return
+        while self.size > 0.9 * self.max_bytes:
+            rows = self.db.execute('SELECT key, size FROM svos ORDER BY used LIMIT ?', (COMMIT_EVERY,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.db.execute('DELETE FROM svos WHERE key = ?', (key,))
+                self.size -= size
+                if self.size <= 0.9 * self.max_bytes:
+                    return
+
+    def close(self):
+        self.evict()
+        self.db.commit()
+        self.db.close()
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return 'cache: %d hits, %d misses (%.1f%% hit rate)' % (self.hits, self.misses, rate)
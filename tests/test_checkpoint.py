@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+import pytest
+
+import main
+from checkpoint import checkpoint_path, recover
+
+
+class Killed(Exception):
+    pass
+
+
+def fake_results(rows, *args, die_after=None, **kwargs):
+    # one triple per sentence, without parsing; dies after die_after rows as an interrupted run
+    for n, (rid, sen) in enumerate(rows):
+        if die_after is not None and n == die_after:
+            raise Killed()
+        yield rid, sen, {'extended_SVO': [['muslim', 'attack %d' % rid, 'jew']]}
+
+
+def corpus(n):
+    return pd.DataFrame({'id': list(range(1, n + 1)), 'sentence': ['sentence %d' % i for i in range(1, n + 1)]})
+
+
+def run(monkeypatch, savepath, die_after=None, **kwargs):
+    monkeypatch.setattr(main, 'extract_results',
+                        lambda rows, *args, **kw: fake_results(rows, die_after=die_after))
+    main.get_SVOs(corpus(20), None, savepath, **kwargs)
+
+
+def test_resume_after_a_run_killed_before_its_first_checkpoint(tmp_path, monkeypatch):
+    outpath = str(tmp_path / 'SVOs.json')
+    run(monkeypatch, str(tmp_path), checkpoint_every=5)
+    with open(outpath, 'rb') as in_file:
+        expected = in_file.read()
+
+    # a new run over the complete output, killed before its first checkpoint
+    with pytest.raises(Killed):
+        run(monkeypatch, str(tmp_path), die_after=3, checkpoint_every=10)
+    assert recover(outpath) == (None, 0)
+
+    run(monkeypatch, str(tmp_path), resume=True, checkpoint_every=10)
+    with open(outpath, 'rb') as in_file:
+        assert in_file.read() == expected
+
+
+def test_checkpoint_past_the_end_of_the_output_is_rejected(tmp_path, monkeypatch):
+    outpath = str(tmp_path / 'SVOs.json')
+    run(monkeypatch, str(tmp_path), checkpoint_every=5)
+    with open(outpath, 'r+b') as out_file:
+        out_file.truncate(os.path.getsize(outpath) // 2)
+
+    assert os.path.exists(checkpoint_path(outpath))
+    with pytest.raises(ValueError):
+        recover(outpath)
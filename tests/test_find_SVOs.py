@@ -0,0 +1,79 @@
+import pytest
+import spacy
+from spacy.tokens import Doc
+
+from find_SVOs import findSVOs
+from lexicon import LexiconMatcher
+from main import filter_triples
+from utils import mergesubtokens, set_passive_spans
+
+
+LABELS = sorted(['muslim', 'jew', 'christian', 'non-muslim', 'leader of the muslim'],
+                key=lambda label: (len(label.split()), len(label)), reverse=True)
+
+# sentences with their parse, as (text, pos, tag, dep, head) per token
+SENTENCES = [
+    # the muslims attacked the jews .
+    [('the', 'DET', 'DT', 'det', 1), ('muslims', 'NOUN', 'NNS', 'nsubj', 2), ('attacked', 'VERB', 'VBD', 'ROOT', 2),
+     ('the', 'DET', 'DT', 'det', 4), ('jews', 'NOUN', 'NNS', 'dobj', 2), ('.', 'PUNCT', '.', 'punct', 2)],
+    # the police arrested the jews .
+    [('the', 'DET', 'DT', 'det', 1), ('police', 'NOUN', 'NNS', 'nsubj', 2), ('arrested', 'VERB', 'VBD', 'ROOT', 2),
+     ('the', 'DET', 'DT', 'det', 4), ('jews', 'NOUN', 'NNS', 'dobj', 2), ('.', 'PUNCT', '.', 'punct', 2)],
+    # the jews were attacked by the muslims .
+    [('the', 'DET', 'DT', 'det', 1), ('jews', 'NOUN', 'NNS', 'nsubjpass', 3), ('were', 'AUX', 'VBD', 'auxpass', 3),
+     ('attacked', 'VERB', 'VBN', 'ROOT', 3), ('by', 'ADP', 'IN', 'agent', 3), ('the', 'DET', 'DT', 'det', 6),
+     ('muslims', 'NOUN', 'NNS', 'pobj', 4), ('.', 'PUNCT', '.', 'punct', 3)],
+    # the leader of the muslims attacked the christians .
+    [('the', 'DET', 'DT', 'det', 1), ('leader', 'NOUN', 'NN', 'nsubj', 5), ('of', 'ADP', 'IN', 'prep', 1),
+     ('the', 'DET', 'DT', 'det', 4), ('muslims', 'NOUN', 'NNS', 'pobj', 2), ('attacked', 'VERB', 'VBD', 'ROOT', 5),
+     ('the', 'DET', 'DT', 'det', 7), ('christians', 'NOUN', 'NNS', 'dobj', 5), ('.', 'PUNCT', '.', 'punct', 5)],
+    # the muslims and the police attacked the jews and the soldiers .
+    [('the', 'DET', 'DT', 'det', 1), ('muslims', 'NOUN', 'NNS', 'nsubj', 5), ('and', 'CCONJ', 'CC', 'cc', 1),
+     ('the', 'DET', 'DT', 'det', 4), ('police', 'NOUN', 'NNS', 'conj', 1), ('attacked', 'VERB', 'VBD', 'ROOT', 5),
+     ('the', 'DET', 'DT', 'det', 7), ('jews', 'NOUN', 'NNS', 'dobj', 5), ('and', 'CCONJ', 'CC', 'cc', 7),
+     ('the', 'DET', 'DT', 'det', 10), ('soldiers', 'NOUN', 'NNS', 'conj', 7), ('.', 'PUNCT', '.', 'punct', 5)],
+    # the non-muslims attacked the jews .
+    [('the', 'DET', 'DT', 'det', 3), ('non', 'ADJ', 'JJ', 'amod', 3), ('-', 'PUNCT', 'HYPH', 'punct', 3),
+     ('muslims', 'NOUN', 'NNS', 'nsubj', 4), ('attacked', 'VERB', 'VBD', 'ROOT', 4), ('the', 'DET', 'DT', 'det', 6),
+     ('jews', 'NOUN', 'NNS', 'dobj', 4), ('.', 'PUNCT', '.', 'punct', 4)],
+    # the jews said that the muslims attacked the christians .
+    [('the', 'DET', 'DT', 'det', 1), ('jews', 'NOUN', 'NNS', 'nsubj', 2), ('said', 'VERB', 'VBD', 'ROOT', 2),
+     ('that', 'SCONJ', 'IN', 'mark', 6), ('the', 'DET', 'DT', 'det', 5), ('muslims', 'NOUN', 'NNS', 'nsubj', 6),
+     ('attacked', 'VERB', 'VBD', 'ccomp', 2), ('the', 'DET', 'DT', 'det', 8), ('christians', 'NOUN', 'NNS', 'dobj', 6),
+     ('.', 'PUNCT', '.', 'punct', 2)],
+    # muslims did not help the leader of the jews .
+    [('muslims', 'NOUN', 'NNS', 'nsubj', 3), ('did', 'AUX', 'VBD', 'aux', 3), ('not', 'PART', 'RB', 'neg', 3),
+     ('help', 'VERB', 'VB', 'ROOT', 3), ('the', 'DET', 'DT', 'det', 5), ('leader', 'NOUN', 'NN', 'dobj', 3),
+     ('of', 'ADP', 'IN', 'prep', 5), ('the', 'DET', 'DT', 'det', 8), ('jews', 'NOUN', 'NNS', 'pobj', 6),
+     ('.', 'PUNCT', '.', 'punct', 3)],
+    # the soldiers helped the villagers .
+    [('the', 'DET', 'DT', 'det', 1), ('soldiers', 'NOUN', 'NNS', 'nsubj', 2), ('helped', 'VERB', 'VBD', 'ROOT', 2),
+     ('the', 'DET', 'DT', 'det', 4), ('villagers', 'NOUN', 'NNS', 'dobj', 2), ('.', 'PUNCT', '.', 'punct', 2)],
+]
+
+
+def make_doc(vocab, tokens):
+    # as it comes out of the pipeline: sub-tokens merged and passive spans set
+    words = [tok[0] for tok in tokens]
+    spaces = [not (word in ('non', '-') or (i + 1 < len(words) and words[i + 1] == '.'))
+              for i, word in enumerate(words)]
+    spaces[-1] = False
+    doc = Doc(vocab, words=words, spaces=spaces, pos=[tok[1] for tok in tokens], tags=[tok[2] for tok in tokens],
+              deps=[tok[3] for tok in tokens], heads=[tok[4] for tok in tokens],
+              lemmas=[tok[0] for tok in tokens])
+    mergesubtokens(doc)
+    set_passive_spans(doc)
+    return doc
+
+
+@pytest.fixture(scope='module')
+def vocab():
+    return spacy.blank('en').vocab
+
+
+@pytest.mark.parametrize('tokens', SENTENCES, ids=[' '.join(tok[0] for tok in s) for s in SENTENCES])
+def test_targeted_keeps_the_filtered_triples(vocab, tokens):
+    lexicon = LexiconMatcher(LABELS)
+    doc = make_doc(vocab, tokens)
+    assert (filter_triples(findSVOs(doc, structured=True), lexicon, structured=True) ==
+            filter_triples(findSVOs(doc, structured=True, lexicon=lexicon), lexicon, structured=True))
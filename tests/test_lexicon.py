@@ -0,0 +1,73 @@
+import re
+
+import pytest
+
+from lexicon import LexiconMatcher
+
+
+# the matching of the labels before the lexicon was compiled, one regex per label (see utils.boolregex and
+# utils.get_inout_grp before LexiconMatcher, and main.filter)
+def clean(s):
+    s = re.sub(r'(#|&|:|"|\?)', ' ', s)
+    s = re.sub(r'[ \t\n\r\f\v]+', ' ', s)
+    return s.strip()
+
+
+def regex_matches(phrase, labels):
+    phrase = clean(phrase)
+    return any(re.search(r'( |^)%s(s|i|in|es)?( |$)' % label, phrase) for label in labels)
+
+
+def regex_first_group(phrase, labels):
+    phrase = clean(phrase)
+    found = []
+    for rank, label in enumerate(labels):
+        match = re.search(r'( |^)%s(s|i|in|es)?( |$)' % label, phrase)
+        if match:
+            found.append((match.span(0)[0], rank, label))
+    return min(found)[2] if found else None
+
+
+def substring_mentioned(sen, labels):
+    return any(label in sen for label in labels)
+
+
+# in the order of get_inoutinstances: more words first, then longer first
+LABELS = sorted(['muslim', 'jew', 'christian', 'crusader', 'mujahid', 'shia', 'white', 'non-muslim',
+                 'white supremacist', 'leader of the muslim'],
+                key=lambda label: (len(label.split()), len(label)), reverse=True)
+
+PHRASES = [
+    # suffixes
+    'the muslims', 'the mujahidin', 'the jewes', 'the shiai', 'the christianity',
+    # a label inside a longer word
+    'the jewish people', 'muslimness', 'the whiteboard',
+    # overlapping labels
+    'the white supremacists', 'white people', 'the non-muslims', 'non-muslim and muslim',
+    'the white supremacist jews', 'jews and white supremacists',
+    # multi-word labels
+    'the leader of the muslims', 'the leader of the muslim brotherhood', 'leader of muslims',
+    # symbols and spacing
+    'muslims: the crusaders', '"jews"', 'the   crusaders?', '#christians',
+    'nothing to see here', '',
+]
+
+
+@pytest.fixture(scope='module')
+def lexicon():
+    return LexiconMatcher(LABELS)
+
+
+@pytest.mark.parametrize('phrase', PHRASES)
+def test_matches(lexicon, phrase):
+    assert lexicon.matches(phrase) == regex_matches(phrase, LABELS)
+
+
+@pytest.mark.parametrize('phrase', PHRASES)
+def test_first_group(lexicon, phrase):
+    assert lexicon.first_group(phrase) == regex_first_group(phrase, LABELS)
+
+
+@pytest.mark.parametrize('phrase', PHRASES)
+def test_mentioned_in(lexicon, phrase):
+    assert lexicon.mentioned_in(phrase) == substring_mentioned(phrase, LABELS)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'preprocessing'))
+import prepration
+
+
+PARAGRAPHS = pd.DataFrame({'name_id': [1, 2, 3, 4],
+                           'sentence': ['The first paragraph has a sentence. It has two of them.',
+                                        '!!! 123',
+                                        'The first paragraph has a sentence.',
+                                        'A last paragraph with words.']})
+
+
+@pytest.mark.parametrize('dedup', ['exact', 'bloom', 'none'])
+@pytest.mark.parametrize('chunk_size', [1, 2, 4])
+def test_chunks_without_sentences(tmp_path, dedup, chunk_size):
+    # the second paragraph has no sentence left, and with 4 rows split_dataframe ends with an empty chunk when
+    # chunk_size divides it
+    prepration.preprocess(PARAGRAPHS, str(tmp_path) + '/', 'corpus', chunk_size=chunk_size, dedup=dedup,
+                          bloom_capacity=1000, verbose=False)
+    df = pd.read_csv(str(tmp_path / 'corpus_cleaned.csv'))
+
+    assert df['id'].tolist() == list(range(1, len(df) + 1))
+    if dedup == 'none' and chunk_size < 3:
+        assert df['pid'].tolist() == [1, 1, 3, 4]
+    else:
+        assert df['pid'].tolist() == [1, 1, 4]
+    assert not [name for name in os.listdir(str(tmp_path)) if name.startswith('tmp_')]
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from lexicon import LexiconMatcher
+from main import cleaning, filter, prune, select_sentences
+
+
+LABELS = sorted(['muslim', 'jew', 'christian', 'crusader', 'leader of the muslim'],
+                key=lambda label: (len(label.split()), len(label)), reverse=True)
+
+
+def test_prune():
+    lexicon = LexiconMatcher(LABELS)
+    # a single group, however many times it is mentioned, can't give a triple between two distinct groups
+    assert not prune('the muslims attacked the police .', lexicon)
+    assert not prune('the muslims attacked the muslims .', lexicon)
+    # two groups, plain or only matched through a suffix form
+    assert prune('the muslims attacked the jews .', lexicon)
+    assert prune('the jewes attacked the christians .', lexicon)
+    assert prune('the crusaders hate the muslim .', lexicon)
+    assert prune('crusaderes fought muslimin', lexicon)
+    # a multi-word label is a group of its own
+    assert prune('the leader of the muslims met the muslims .', lexicon)
+
+
+def test_select_sentences():
+    lexicon = LexiconMatcher(LABELS)
+    df = pd.DataFrame({'id': [1, 2, 3, 4, 5],
+                       'sentence': ['The Muslims attacked the police.', 'The jewes attacked the Christians.',
+                                    'The weather is nice.', 'The crusaders hate the muslim.',
+                                    'the muslims attacked the muslims .']})
+    counts = {'mentioned': 0, 'pruned': 0}
+    selected = select_sentences(df, lexicon, counts=counts)
+
+    assert selected['id'].tolist() == [2, 4]
+    assert selected['sentence'].tolist() == [cleaning('The jewes attacked the Christians.'),
+                                             cleaning('The crusaders hate the muslim.')]
+    assert counts == {'mentioned': 4, 'pruned': 2}
+    # without pruning, every sentence mentioning a group is kept
+    assert select_sentences(df, lexicon, no_prune=True)['id'].tolist() == [1, 2, 4, 5]
+    assert all(filter(sen, lexicon) for sen in selected['sentence'])
@@ -1,12 +1,11 @@
+from spacy.language import Language
 from spacy.matcher import Matcher
-import spacy
-import re
+from spacy.tokens import Doc
 import pandas as pd
+from collections import Counter
 
-
-nlp = spacy.load('en_core_web_lg')
-matcher1 = Matcher(nlp.vocab)
-matcher2 = Matcher(nlp.vocab)
+from lexicon import LexiconMatcher
+import profiler
 
 passive_rule_0 = [{'DEP': 'nsubjpass'}, {'DEP': 'aux', 'OP': '?'}, {'DEP': 'neg', 'OP': '?'},
                   {'DEP': 'prep', 'OP': '?'}, {'DEP': 'poss', 'OP': '?'}, {'DEP': 'amod', 'OP': '?'},
@@ -30,6 +29,25 @@ merge_rule = [{'IS_ALPHA': True, 'IS_SPACE': False},
            {'IS_ALPHA': True, 'IS_SPACE': False}]
 
 
+# set by the passive_phrases component: the widest passive spans as (start, end) token offsets, and for every token
+# whether it falls in one of them
+Doc.set_extension('passive_spans', default=None, force=True)
+Doc.set_extension('in_passive', default=None, force=True)
+# set once the hyphenated sub-tokens are merged
+Doc.set_extension('subtokens_merged', default=False, force=True)
+
+# the matchers are built on first use, for the vocab of the pipeline the docs come from
+_matchers = {}
+
+
+def _get_matcher(key, vocab, patterns):
+    if key not in _matchers or _matchers[key].vocab is not vocab:
+        matcher = Matcher(vocab)
+        matcher.add(key, patterns)
+        _matchers[key] = matcher
+    return _matchers[key]
+
+
 def get_inoutinstances(pathtoinoutfile):
     df = pd.read_csv(pathtoinoutfile)
     df['group_name'] = df['group_name'].apply(lambda x: str(x).lstrip().rstrip().lower())
@@ -54,31 +72,28 @@ def _is_passive(tokens):
     return False
 
 
-def passive_phrases(tokens):
-    def widest_match(matches):
-        final_matches = []
-        for i in range(0, len(matches)):
-            f_match = matches[i]
-            flag = True
-            for j in range(0, len(matches)):
-                if i != j:
-                    s_match = matches[j]
-
-                    if f_match[1] >= s_match[1] and f_match[2] <= s_match[2]:
-                        flag = False
-                        break
-            if flag:
-                final_matches.append(f_match)
-        return final_matches
+def widest_match(matches):
+    # drop the matches covered by another one; sorted by start and then by the widest end first, a match is covered
+    # iff one of the matches before it reaches at least as far
+    spans = Counter((match[1], match[2]) for match in matches)
+    widest = set()
+    max_end = -1
+    for start, end in sorted(spans, key=lambda x: (x[0], -x[1])):
+        if end > max_end and spans[(start, end)] == 1:
+            widest.add((start, end))
+        max_end = max(max_end, end)
+    return [match for match in matches if (match[1], match[2]) in widest]
 
+
+def passive_phrases(tokens):
     p_phrases = []
     m_indexes = []
 
     if not _is_passive(tokens):
         return False, p_phrases, m_indexes
 
-    matcher1.add('Passive', [passive_rule_0, passive_rule_1, passive_rule_2, passive_rule_3, passive_rule_4,
-                            passive_rule_5, passive_rule_6])
+    matcher1 = _get_matcher('Passive', tokens.vocab, [passive_rule_0, passive_rule_1, passive_rule_2, passive_rule_3,
+                                                      passive_rule_4, passive_rule_5, passive_rule_6])
     matches = matcher1(tokens)
 
     if len(matches) > 0:
@@ -92,8 +107,35 @@ def passive_phrases(tokens):
         return False, p_phrases, m_indexes
 
 
+def set_passive_spans(tokens):
+    _, _, m_indexes = passive_phrases(tokens)
+    in_passive = [False] * len(tokens)
+    for start, end in m_indexes:
+        # the token right after a span counts as well, as in is_in_matches
+        for i in range(start, min(end + 1, len(tokens))):
+            in_passive[i] = True
+    tokens._.passive_spans = m_indexes
+    tokens._.in_passive = in_passive
+
+
+def in_passive(tokens, vid):
+    return tokens._.in_passive[vid]
+
+
+# the components are timed as stages of their own (see profiler.py), included in the time of parse; with nlp.pipe on
+# several processes, they run, and are timed, in the worker processes, which don't report their stages
+@Language.component('passive_phrases')
+def passive_phrases_component(doc):
+    with profiler.stage('passive_phrases'):
+        set_passive_spans(doc)
+    return doc
+
+
 def mergesubtokens(tokens):
-    matcher2.add("Hyphenated", [merge_rule])
+    if tokens._.subtokens_merged:
+        return
+
+    matcher2 = _get_matcher('Hyphenated', tokens.vocab, [merge_rule])
     matches = matcher2(tokens)
     prev_st = 0
     prev_ed = 0
@@ -114,48 +156,34 @@ def mergesubtokens(tokens):
 
             retokenizer.merge(tokens[prev_st:prev_ed])
 
+    # the token offsets of the passive spans (if any) are no longer valid
+    tokens._.passive_spans = None
+    tokens._.in_passive = None
+    tokens._.subtokens_merged = True
+
+
+# not merge_subtokens, which would replace the component of spaCy with that name
+@Language.component('merge_hyphenated')
+def merge_hyphenated_component(doc):
+    with profiler.stage('merge_hyphenated'):
+        mergesubtokens(doc)
+    return doc
+
+
+def _as_matcher(inoutlabels):
+    # the callers are expected to compile the lexicon once, a plain list of labels is compiled on the fly
+    if isinstance(inoutlabels, LexiconMatcher):
+        return inoutlabels
+    return LexiconMatcher(inoutlabels)
+
 
 def boolregex(phrase, inoutlabels):
-    def clean(s):
-        symbols = r'(#|&|:|"|\?)'
-        WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
-        s = re.sub(symbols, ' ', s)
-        s = re.sub(WHITESPACEREGEX, ' ', s)
-        return s.strip()
-
-    phrase = clean(phrase)
-    for form in inoutlabels:
-        if re.search(r'( |^)%s(s|i|in|es)?( |$)' % (form), phrase):
-            return True
-    return False
+    return _as_matcher(inoutlabels).matches(phrase)
 
 
 def get_inout_grp(phrase, inoutlabels):
-    def clean(s):
-        symbols = r'(#|&|:|"|\?)'
-        WHITESPACEREGEX = r'[ \t\n\r\f\v]+'
-        s = re.sub(symbols, ' ', s)
-        s = re.sub(WHITESPACEREGEX, ' ', s)
-        return s.strip()
-
-    phrase = clean(phrase)
-
-    matches = []
-    indexs = []
-    occurs = []
-    c = 0
-    for form in inoutlabels:
-        if re.search(r'( |^)%s(s|i|in|es)?( |$)' % (form), phrase):
-            matches.append(form)
-            indexs.append(re.search(r'( |^)%s(s|i|in|es)?( |$)' % (form), phrase).span(0)[0])
-            occurs.append(c)
-            c += 1
-
     # return the first match in sentence, if exist
-    if len(matches) > 0:
-        _, _, matches = zip(*sorted(zip(indexs, occurs, matches)))
-        return matches[0]
-    return None
+    return _as_matcher(inoutlabels).first_group(phrase)
 
 
 def _is_aux_verb(toks):